@@ -0,0 +1,142 @@
+"""
+Load test for the micro-batching scoring service, entirely in-process.
+
+Drives the ASGI app from takealot_service directly (no sockets, no HTTP
+client library) with --concurrency clients that each send --requests
+single-session POST /score calls back to back, once with batching disabled
+(max batch size 1) and once with the given batch settings. Reports client
+throughput and p50/p99 latency plus the service's own /stats.
+
+Usage (from FinalCapstoneSubmission/):
+    python benchmarks/bench_service.py --concurrency 64 --requests 50 --output benchmarks/results/service.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
+
+import numpy as np
+import pandas as pd
+
+from takealot_models import ModelRegistry
+from takealot_scoring import XGB_FEATURES
+from takealot_service import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS, ServiceStats, create_app
+
+# The file "Load Demo Dataset" reads; synthetic rows are used when it is absent
+DEMO_DATASET = os.path.join(APP_DIR, "online_shoppers_Intention_cleaned.csv")
+
+
+async def asgi_request(app, method, path, body=b""):
+    """Call an ASGI app once; returns (status, parsed JSON body)."""
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+             "method": method, "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "scheme": "http", "server": ("bench", 80), "client": ("bench", 1),
+             "headers": [(b"content-type", b"application/json")]}
+    request_sent = False
+    response = {"status": None, "body": b""}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()  # never disconnects
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], json.loads(response["body"])
+
+
+def load_sessions(n_rows):
+    """Request bodies built from the demo dataset (or random rows if it is missing)."""
+    if os.path.exists(DEMO_DATASET):
+        frame = pd.read_csv(DEMO_DATASET, usecols=XGB_FEATURES, nrows=n_rows)
+    else:
+        rng = np.random.default_rng(42)
+        frame = pd.DataFrame(rng.random((n_rows, len(XGB_FEATURES))), columns=XGB_FEATURES)
+    return [json.dumps(row).encode() for row in frame[XGB_FEATURES].to_dict(orient="records")]
+
+
+async def run_load(models, sessions, concurrency, requests, max_batch_size, max_wait_ms):
+    app = create_app(models, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    latencies = []
+
+    async def client(offset):
+        for i in range(requests):
+            body = sessions[(offset * requests + i) % len(sessions)]
+            start = time.perf_counter()
+            status, _ = await asgi_request(app, "POST", "/score", body)
+            latencies.append(time.perf_counter() - start)
+            assert status == 200, status
+
+    async with app.router.lifespan_context(app):
+        await asgi_request(app, "POST", "/score", sessions[0])  # warm-up
+        app.state.batcher.stats = ServiceStats()  # measure the load run only
+        start = time.perf_counter()
+        await asyncio.gather(*(client(c) for c in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        _, stats = await asgi_request(app, "GET", "/stats")
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "max_batch_size": max_batch_size,
+        "max_wait_ms": max_wait_ms,
+        "requests": len(latencies),
+        "throughput_per_second": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "service_stats": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=64, help="simultaneous clients")
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--output", default=os.path.join(APP_DIR, "benchmarks", "results", "service.json"),
+                        help="results JSON (default: benchmarks/results/service.json, git-ignored)")
+    args = parser.parse_args()
+
+    models = ModelRegistry()
+    sessions = load_sessions(2000)
+    runs = {}
+    for name, batch_size, wait_ms in [("unbatched", 1, 0.0),
+                                      ("micro_batched", args.max_batch_size, args.max_wait_ms)]:
+        runs[name] = asyncio.run(run_load(models, sessions, args.concurrency, args.requests,
+                                          batch_size, wait_ms))
+
+    results = {
+        "benchmark": "service",
+        "generated": datetime.now().isoformat(),
+        "concurrency": args.concurrency,
+        **runs,
+        "throughput_gain": (runs["micro_batched"]["throughput_per_second"]
+                            / runs["unbatched"]["throughput_per_second"]),
+    }
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for name, run in runs.items():
+        print(f"{name:<14} {run['throughput_per_second']:8.0f} req/s   p50 {run['p50_ms']:7.1f} ms   "
+              f"p99 {run['p99_ms']:7.1f} ms   mean batch {run['service_stats']['mean_batch_size']:.1f}")
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Single-row latency benchmark: array-backed fast path vs. the sklearn wrapper.
+
+Validates the flattened ensemble against `models/xgboost_model.joblib` on
+synthetic boundary rows, then reports p50/p99 latency for both paths.
+
+Usage (from FinalCapstoneSubmission/):
+    python benchmarks/bench_single_row.py --repeat 2000 --output benchmarks/results/single_row.json
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
+
+import pandas as pd
+
+from takealot_fastpath import (FlatTreeEnsemble, latency_report, validate_fast_path,
+                               validation_rows)
+from takealot_models import ModelRegistry
+from takealot_scoring import XGB_FEATURES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000, help="timed calls for the fast path")
+    parser.add_argument("--output", default=os.path.join(APP_DIR, "benchmarks", "results", "single_row.json"))
+    args = parser.parse_args()
+
+    xgb_model = ModelRegistry().xgb()
+    ensemble = FlatTreeEnsemble(xgb_model)
+    rows = validation_rows(ensemble, n_rows=1024)
+    max_error = validate_fast_path(ensemble, xgb_model, rows)
+
+    # The reference path mirrors get_predictions: a 1-row DataFrame into predict_proba
+    def reference(row):
+        return xgb_model.predict_proba(pd.DataFrame([row], columns=XGB_FEATURES))[0][1]
+
+    fast = latency_report(ensemble.predict_proba_row, rows, repeat=args.repeat)
+    ref = latency_report(reference, rows, repeat=max(args.repeat // 10, 50))
+
+    results = {
+        "benchmark": "single_row",
+        "generated": datetime.now().isoformat(),
+        "n_trees": ensemble.n_trees,
+        "max_depth": ensemble.max_depth,
+        "max_abs_error": max_error,
+        "fast_path": fast,
+        "sklearn_predict_proba": ref,
+        "speedup_p50": ref["p50_us"] / fast["p50_us"],
+    }
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"Max |fast - reference|: {max_error:.2e}")
+    for name in ("fast_path", "sklearn_predict_proba"):
+        print(f"{name:<24} p50 {results[name]['p50_us']:9.1f} us   p99 {results[name]['p99_us']:9.1f} us")
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Startup-time benchmark for the Takealot Analytics Hub.
+
+Every measurement runs in a fresh interpreter so import caches are cold, the
+way they are when a shinyapps.io or container instance starts. Reports the
+median over --repeat runs and writes the results as JSON.
+
+Usage (from FinalCapstoneSubmission/):
+    python benchmarks/bench_startup.py --repeat 5 --output benchmarks/results/startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each probe prints a JSON dict of {metric: seconds}
+PROBES = {
+    "import_heavy_libraries": """
+import json, time
+timings = {}
+for name in ["pandas", "xgboost", "shap", "matplotlib.pyplot", "seaborn"]:
+    start = time.perf_counter()
+    __import__(name)
+    timings[f"import_{name.replace('.', '_')}"] = time.perf_counter() - start
+print(json.dumps(timings))
+""",
+    "app_startup": """
+import json, time
+start = time.perf_counter()
+import takealot_app
+imported = time.perf_counter() - start
+takealot_app.models.warm().join()
+warmed = time.perf_counter() - start
+timings = {"import_app": imported, "app_fully_warm": warmed}
+timings.update({f"load_{name}": secs for name, secs in takealot_app.models.load_seconds.items()})
+print(json.dumps(timings))
+""",
+}
+
+
+def run_probe(code):
+    completed = subprocess.run([sys.executable, "-W", "ignore", "-c", code], cwd=APP_DIR,
+                               capture_output=True, text=True, check=True)
+    # The app prints load messages; the probe's JSON is always the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="cold-start runs per probe")
+    parser.add_argument("--output", default=os.path.join(APP_DIR, "benchmarks", "results", "startup.json"))
+    args = parser.parse_args()
+
+    samples = {}
+    for name, code in PROBES.items():
+        for i in range(args.repeat):
+            print(f"⏱️  {name} run {i + 1}/{args.repeat}")
+            for metric, seconds in run_probe(code).items():
+                samples.setdefault(metric, []).append(seconds)
+
+    results = {
+        "benchmark": "startup",
+        "generated": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "median_seconds": {metric: statistics.median(values) for metric, values in samples.items()},
+        "samples_seconds": samples,
+    }
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for metric, seconds in results["median_seconds"].items():
+        print(f"{metric:<28} {seconds * 1000:10.1f} ms")
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
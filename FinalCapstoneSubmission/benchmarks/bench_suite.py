@@ -0,0 +1,405 @@
+"""
+Offline benchmark suite for the dashboard's scoring, explanation, rendering and export paths.
+
+Runs against the shipped models/ artifacts and synthetic sessions generated
+in the online_shoppers_intention.csv layout (cached under --data-dir, so
+repeated runs reuse them). Sections:
+
+    single_row  get_predictions-equivalent latency (cold and cached)
+    batch       stream_score_csv / parallel_score_csv throughput per --sizes
+    shap        TreeExplainer cost per row (single row and batched)
+    render      shap_plot chart render time
+    sensitivity what-if sweep (curve and heatmap) vs one predict_proba per point
+    counterfactual  flip search per "Unlikely" customer, default time budget
+    ingest      feature CSV reading, cleaned and raw layouts, per engine
+    export      download streaming per format, prediction log export
+
+Metrics are written as one flat JSON dict. Names ending in _per_second are
+higher-is-better; _us, _ms and _seconds are lower-is-better. With
+--baseline, every shared metric is compared and the run exits with status 1
+if any regressed by more than --tolerance. Runs write to
+benchmarks/results/, which git ignores apart from baseline.json: record that
+one on purpose (first usage line) and commit it, so regression checks compare
+against a known run.
+
+Usage (from FinalCapstoneSubmission/):
+    python benchmarks/bench_suite.py --output benchmarks/results/baseline.json
+    python benchmarks/bench_suite.py --baseline benchmarks/results/baseline.json
+    python benchmarks/bench_suite.py --quick --only single_row,render
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
+
+import numpy as np
+import pandas as pd
+
+from takealot_cache import PredictionCache, feature_key
+from takealot_export import available_formats, export_csv_file, export_frame
+from takealot_fastpath import latency_report, nearest_cluster
+from takealot_ingest import (RAW_COLUMNS, compact_features, engineer_features, iter_feature_chunks,
+                             default_engine)
+from takealot_models import ModelRegistry
+from takealot_scoring import (DEFAULT_DECISION_THRESHOLD, KMEANS_FEATURES, XGB_FEATURES,
+                              parallel_score_csv, shutdown_scoring_pool, stream_score_csv)
+
+SECTIONS = ["single_row", "batch", "shap", "render", "sensitivity", "counterfactual", "ingest", "export"]
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+QUICK_SIZES = [10_000]
+DEFAULT_TOLERANCE = 0.25
+GENERATE_CHUNK_ROWS = 100_000
+
+# Category shares of the UCI online shoppers data, so the synthetic rows hit
+# the same tree paths and clusters as real traffic
+MONTH_SHARES = {"May": 0.273, "Nov": 0.243, "Mar": 0.155, "Dec": 0.14, "Oct": 0.045, "Sep": 0.036,
+                "Aug": 0.035, "Jul": 0.035, "June": 0.023, "Feb": 0.015}
+VISITOR_SHARES = {"Returning_Visitor": 0.856, "New_Visitor": 0.137, "Other": 0.007}
+SPECIAL_DAY_SHARES = {0.0: 0.899, 0.2: 0.014, 0.4: 0.02, 0.6: 0.028, 0.8: 0.026, 1.0: 0.012}
+OS_SHARES = {1: 0.21, 2: 0.535, 3: 0.207, 4: 0.039, 5: 0.001, 6: 0.002, 7: 0.001, 8: 0.006}
+BROWSER_SHARES = {1: 0.2, 2: 0.646, 3: 0.009, 4: 0.06, 5: 0.038, 6: 0.014, 7: 0.004, 8: 0.011,
+                  10: 0.013, 12: 0.001, 13: 0.005}
+REGION_SHARES = {1: 0.388, 2: 0.092, 3: 0.195, 4: 0.096, 5: 0.026, 6: 0.065, 7: 0.062, 8: 0.035, 9: 0.041}
+TRAFFIC_SHARES = {1: 0.199, 2: 0.317, 3: 0.166, 4: 0.087, 5: 0.021, 6: 0.036, 8: 0.028, 10: 0.036,
+                  11: 0.02, 13: 0.06, 20: 0.016, 9: 0.014}
+
+
+# ---- Synthetic data -----------------------------------------------------
+
+def _choice(rng, shares, n_rows):
+    values = list(shares)
+    weights = np.array(list(shares.values()), dtype=np.float64)
+    return np.asarray(values)[rng.choice(len(values), size=n_rows, p=weights / weights.sum())]
+
+
+def synthetic_sessions(n_rows, seed=42):
+    """Raw-export rows (online_shoppers_intention.csv columns, with Revenue)."""
+    rng = np.random.default_rng(seed)
+
+    def page_counts(mean):
+        return rng.negative_binomial(1, 1 / (1 + mean), size=n_rows)
+
+    def durations(counts, log_mean, log_sigma):
+        return np.where(counts > 0, rng.lognormal(log_mean, log_sigma, size=n_rows), 0.0).round(2)
+
+    administrative = page_counts(2.3)
+    informational = page_counts(0.5)
+    product_related = page_counts(31.7) + 1
+    bounce = np.where(rng.random(n_rows) < 0.45, 0.0, np.minimum(rng.beta(0.6, 20, size=n_rows), 0.2))
+    frame = pd.DataFrame({
+        "Administrative": administrative,
+        "Administrative_Duration": durations(administrative, 4.0, 1.2),
+        "Informational": informational,
+        "Informational_Duration": durations(informational, 4.0, 1.3),
+        "ProductRelated": product_related,
+        "ProductRelated_Duration": durations(product_related, 6.3, 1.1),
+        "BounceRates": bounce.round(6),
+        "ExitRates": np.minimum(bounce + rng.beta(2, 50, size=n_rows), 0.2).round(6),
+        "PageValues": np.where(rng.random(n_rows) < 0.22, rng.lognormal(3.0, 1.0, size=n_rows), 0.0).round(4),
+        "SpecialDay": _choice(rng, SPECIAL_DAY_SHARES, n_rows),
+        "Month": _choice(rng, MONTH_SHARES, n_rows),
+        "OperatingSystems": _choice(rng, OS_SHARES, n_rows),
+        "Browser": _choice(rng, BROWSER_SHARES, n_rows),
+        "Region": _choice(rng, REGION_SHARES, n_rows),
+        "TrafficType": _choice(rng, TRAFFIC_SHARES, n_rows),
+        "VisitorType": _choice(rng, VISITOR_SHARES, n_rows),
+        "Weekend": np.where(rng.random(n_rows) < 0.233, "TRUE", "FALSE"),
+        "Revenue": np.where(rng.random(n_rows) < 0.155, "TRUE", "FALSE"),
+    })
+    return frame[RAW_COLUMNS + ["Revenue"]]
+
+
+def dataset_paths(n_rows, data_dir, seed=42):
+    """(raw CSV, cleaned CSV) of `n_rows` synthetic sessions, generated on first use."""
+    raw_path = os.path.join(data_dir, f"sessions_raw_{n_rows}_{seed}.csv")
+    cleaned_path = os.path.join(data_dir, f"sessions_cleaned_{n_rows}_{seed}.csv")
+    if not (os.path.exists(raw_path) and os.path.exists(cleaned_path)):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"Generating {n_rows:,} synthetic sessions in {data_dir}")
+        for path in (raw_path, cleaned_path):
+            if os.path.exists(path):
+                os.remove(path)
+        for start in range(0, n_rows, GENERATE_CHUNK_ROWS):
+            raw = synthetic_sessions(min(GENERATE_CHUNK_ROWS, n_rows - start), seed + start)
+            cleaned = compact_features(engineer_features(raw))
+            cleaned.insert(cleaned.columns.get_loc("Weekend") + 1, "Revenue",
+                           (raw["Revenue"] == "TRUE").astype(np.int8).to_numpy())
+            raw.to_csv(raw_path, mode="a", header=start == 0, index=False)
+            cleaned.to_csv(cleaned_path, mode="a", header=start == 0, index=False)
+    return raw_path, cleaned_path
+
+
+# ---- Measurements -------------------------------------------------------
+
+def median_seconds(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def bench_single_row(models, rows, repeat):
+    """Latency of the get_predictions work for one customer, with and without a cache hit."""
+    kmeans_model, explainer, fast_xgb = models.kmeans(), models.explainer(), models.fast_xgb()
+    kmeans_positions = [XGB_FEATURES.index(col) for col in KMEANS_FEATURES]
+    cache = PredictionCache(max_entries=1024, ttl_seconds=0)
+
+    def cold(row):
+        xgb_data = pd.DataFrame([row], columns=XGB_FEATURES)
+        vector = xgb_data.to_numpy(dtype=np.float32)[0]
+        key = feature_key(vector)
+        cluster = nearest_cluster(kmeans_model, row[kmeans_positions])
+        probability = fast_xgb.predict_proba_row(vector)
+        shap_values = explainer.shap_values(xgb_data)[0]
+        cache.put(key, {"cluster": cluster, "purchase_prob": probability, "shap_values": shap_values})
+
+    def cached(row):
+        cache.get(feature_key(row.astype(np.float32)))
+
+    cold_report = latency_report(cold, rows, repeat=repeat)
+    cached_report = latency_report(cached, rows, repeat=repeat)
+    return {"cold_p50_us": cold_report["p50_us"], "cold_p99_us": cold_report["p99_us"],
+            "cached_p50_us": cached_report["p50_us"], "cached_p99_us": cached_report["p99_us"]}
+
+
+def bench_batch(models, sizes, data_dir, workers):
+    metrics = {}
+    output_path = os.path.join(data_dir, "scored.csv")
+    for n_rows in sizes:
+        _, cleaned_path = dataset_paths(n_rows, data_dir)
+        start = time.perf_counter()
+        stream_score_csv(cleaned_path, output_path, models.kmeans(), models.xgb())
+        metrics[f"{n_rows}.rows_per_second"] = n_rows / (time.perf_counter() - start)
+        if workers > 1:
+            # Pool start-up is excluded: the dashboard keeps its pool alive between jobs
+            parallel_score_csv(cleaned_path, output_path, workers=workers, sample_size=1000)
+            start = time.perf_counter()
+            parallel_score_csv(cleaned_path, output_path, workers=workers)
+            metrics[f"{n_rows}.parallel_rows_per_second"] = n_rows / (time.perf_counter() - start)
+    shutdown_scoring_pool()
+    os.remove(output_path)
+    return metrics
+
+
+def bench_shap(models, frame, repeat, batch_rows):
+    explainer = models.explainer()
+    single = frame.iloc[:1]
+    batch = frame.iloc[:batch_rows]
+    return {
+        "single_row_us": median_seconds(lambda: explainer.shap_values(single), repeat) * 1e6,
+        "batch_us_per_row": median_seconds(lambda: explainer.shap_values(batch), 1) * 1e6 / len(batch),
+    }
+
+
+def bench_render(models, frame, repeat):
+    # Imported here: this is the only section that needs matplotlib
+    from takealot_charts import draw_shap_bars, draw_shap_placeholder, render_png
+
+    shap_values = models.explainer().shap_values(frame.iloc[:1])[0]
+    order = np.argsort(np.abs(shap_values))
+    names = [XGB_FEATURES[i] for i in order]
+    render_png(draw_shap_placeholder)  # warm-up: imports and style
+    return {
+        "shap_chart_ms": median_seconds(
+            lambda: render_png(lambda ax: draw_shap_bars(ax, names, shap_values[order])), repeat) * 1e3,
+        "placeholder_ms": median_seconds(lambda: render_png(draw_shap_placeholder), repeat) * 1e3,
+    }
+
+
+def bench_sensitivity(models, frame, repeat):
+    from takealot_whatif import build_grid, sensitivity_sweep
+
+    xgb_model = models.xgb()
+    base = frame.iloc[:1].astype(np.float64)
+    curve_rows = [row.to_frame().T for _, row in build_grid(base, ["PageValues"])[0].iterrows()]
+
+    def one_call_per_point():
+        for row in curve_rows:
+            xgb_model.predict_proba(row)
+
+    return {
+        "curve_ms": median_seconds(lambda: sensitivity_sweep(xgb_model, base, ["PageValues"]), repeat) * 1e3,
+        "heatmap_ms": median_seconds(
+            lambda: sensitivity_sweep(xgb_model, base, ["PageValues", "ExitRates"]), repeat) * 1e3,
+        "single_row_ms": median_seconds(lambda: xgb_model.predict_proba(base), repeat) * 1e3,
+        "per_point_curve_ms": median_seconds(one_call_per_point, 1) * 1e3,
+    }
+
+
+def bench_counterfactual(models, frame, n_customers):
+    from takealot_counterfactual import find_counterfactuals
+
+    xgb_model, ensemble = models.xgb(), models.flat_xgb()
+    probabilities = xgb_model.predict_proba(frame)[:, 1]
+    unlikely = frame[probabilities <= DEFAULT_DECISION_THRESHOLD].astype(np.float64).head(n_customers)
+    searches = [find_counterfactuals(xgb_model, ensemble, unlikely.iloc[[i]].reset_index(drop=True))
+                for i in range(len(unlikely))]
+    seconds = np.array([search["seconds"] for search in searches])
+    return {
+        "search_p50_ms": float(np.percentile(seconds, 50)) * 1e3,
+        "search_max_ms": float(seconds.max()) * 1e3,
+        "rows_scored_per_second": sum(search["rows_scored"] for search in searches) / seconds.sum(),
+    }
+
+
+def bench_ingest(n_rows, data_dir):
+    metrics = {}
+    raw_path, cleaned_path = dataset_paths(n_rows, data_dir)
+    engines = ["c"] + (["pyarrow"] if default_engine() == "pyarrow" else [])
+    for layout, path in (("cleaned", cleaned_path), ("raw", raw_path)):
+        size_mb = os.path.getsize(path) / 1e6
+        for engine in engines:
+            start = time.perf_counter()
+            for _ in iter_feature_chunks(path, engine=engine):
+                pass
+            elapsed = time.perf_counter() - start
+            metrics[f"{layout}.{engine}.rows_per_second"] = n_rows / elapsed
+            metrics[f"{layout}.{engine}.mb_per_second"] = size_mb / elapsed
+    return metrics
+
+
+def bench_export(models, n_rows, data_dir):
+    metrics = {}
+    _, cleaned_path = dataset_paths(n_rows, data_dir)
+    scored_path = os.path.join(data_dir, "scored_export.csv")
+    stream_score_csv(cleaned_path, scored_path, models.kmeans(), models.xgb())
+    size_mb = os.path.getsize(scored_path) / 1e6
+    for fmt in available_formats():
+        start = time.perf_counter()
+        for _ in export_csv_file(scored_path, fmt):
+            pass
+        metrics[f"batch_{fmt}.mb_per_second"] = size_mb / (time.perf_counter() - start)
+    os.remove(scored_path)
+
+    # A full prediction log (10,000 rows), as the predictions download sees it
+    log = pd.read_csv(cleaned_path, usecols=KMEANS_FEATURES, nrows=10_000)
+    log["Cluster"] = pd.Categorical(np.where(log.index % 3, "High-Intent Shoppers", "Casual Browsers"))
+    log["PurchaseProbability"] = np.linspace(0, 1, len(log))
+    log["Timestamp"] = pd.Timestamp.now()
+    for fmt in available_formats():
+        start = time.perf_counter()
+        for _ in export_frame(log, fmt):
+            pass
+        metrics[f"prediction_log_{fmt}_ms"] = (time.perf_counter() - start) * 1e3
+    return metrics
+
+
+# ---- Baselines ----------------------------------------------------------
+
+def higher_is_better(name):
+    return name.endswith("_per_second")
+
+
+def compare(metrics, baseline, tolerance):
+    """Rows of (metric, baseline, current, relative change, regressed) for shared metrics."""
+    rows = []
+    for name in sorted(set(metrics) & set(baseline)):
+        old, new = baseline[name], metrics[name]
+        if not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better(name) else change
+        rows.append((name, old, new, change, worse > tolerance))
+    return rows
+
+
+def environment():
+    import sklearn
+    import xgboost
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "numpy": np.__version__, "pandas": pd.__version__,
+            "xgboost": xgboost.__version__, "scikit-learn": sklearn.__version__}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="batch sizes in rows, comma separated")
+    parser.add_argument("--quick", action="store_true",
+                        help=f"batch size {QUICK_SIZES[0]:,} only and fewer repeats")
+    parser.add_argument("--only", help=f"comma separated sections out of {', '.join(SECTIONS)}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for the parallel batch measurement (1 = skip it)")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "takealot_bench_data"),
+                        help="where synthetic datasets are generated and kept")
+    parser.add_argument("--output", default=os.path.join(APP_DIR, "benchmarks", "results", "suite.json"),
+                        help="results JSON (default: benchmarks/results/suite.json, git-ignored)")
+    parser.add_argument("--baseline", help="earlier results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown per metric (default: %(default)s)")
+    args = parser.parse_args()
+
+    sections = args.only.split(",") if args.only else SECTIONS
+    unknown = [name for name in sections if name not in SECTIONS]
+    if unknown:
+        parser.error(f"unknown sections: {unknown}")
+    sizes = QUICK_SIZES if args.quick else [int(n) for n in args.sizes.split(",")]
+    repeat = 50 if args.quick else 300
+    ingest_rows = min(max(sizes), 100_000)
+
+    models = ModelRegistry()
+    _, cleaned_path = dataset_paths(min(sizes), args.data_dir)
+    sample = pd.read_csv(cleaned_path, usecols=XGB_FEATURES, nrows=1000)[XGB_FEATURES]
+    rows = list(sample.to_numpy(dtype=np.float64)[:256])
+
+    runners = {
+        "single_row": lambda: bench_single_row(models, rows, repeat),
+        "batch": lambda: bench_batch(models, sizes, args.data_dir, args.workers),
+        "shap": lambda: bench_shap(models, sample, max(repeat // 10, 5), 200 if args.quick else 1000),
+        "render": lambda: bench_render(models, sample, max(repeat // 30, 3)),
+        "sensitivity": lambda: bench_sensitivity(models, sample, max(repeat // 10, 5)),
+        "counterfactual": lambda: bench_counterfactual(models, sample, 10 if args.quick else 50),
+        "ingest": lambda: bench_ingest(ingest_rows, args.data_dir),
+        "export": lambda: bench_export(models, ingest_rows, args.data_dir),
+    }
+    metrics = {}
+    for name in sections:
+        start = time.perf_counter()
+        for metric, value in runners[name]().items():
+            metrics[f"{name}.{metric}"] = float(value)
+        print(f"{name:<11} done in {time.perf_counter() - start:6.1f}s")
+
+    results = {
+        "benchmark": "suite",
+        "generated": datetime.now().isoformat(),
+        "environment": environment(),
+        "sizes": sizes,
+        "metrics": metrics,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for name, value in metrics.items():
+        print(f"{name:<44} {value:14,.1f}")
+    print(f"✅ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != results["environment"]:
+            print("⚠️ Baseline was recorded in a different environment; compare with care")
+        rows = compare(metrics, baseline["metrics"], args.tolerance)
+        for name, old, new, change, regressed in rows:
+            flag = "REGRESSION" if regressed else ""
+            print(f"{name:<44} {old:14,.1f} -> {new:14,.1f} {change:+7.1%} {flag}")
+        regressions = [row for row in rows if row[4]]
+        if regressions:
+            print(f"❌ {len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.tolerance:.0%} across {len(rows)} metrics")
+
+
+if __name__ == "__main__":
+    main()
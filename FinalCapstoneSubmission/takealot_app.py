@@ -1,33 +1,38 @@
 from shiny import App, render, ui, reactive
 import pandas as pd
-import joblib
-import shap
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import base64
-from io import BytesIO, StringIO
+import asyncio
+import os
+import time
+from io import StringIO
 from datetime import datetime
 
-# Set style for better plots
-plt.style.use('seaborn-v0_8')
-sns.set_palette("viridis")
+from takealot_scoring import (XGB_FEATURES, KMEANS_FEATURES, DEFAULT_CHUNK_SIZE,
+                              DEFAULT_DECISION_THRESHOLD, DEFAULT_EXPLAIN_ROWS,
+                              count_csv_rows, missing_columns, predict_intent,
+                              parallel_score_csv, stream_score_csv)
+from takealot_jobs import BatchJobRunner, FINISHED, FAILED, CANCELLED
+from takealot_models import ModelRegistry
+from takealot_fastpath import nearest_cluster
+from takealot_cache import PredictionCache, feature_key
+from takealot_artifacts import ArtifactStore
+from takealot_featurecache import FeatureCache
+from takealot_checkpoint import CheckpointStore, model_files_key
+from takealot_ingest import is_raw_export, read_features, read_header
+from takealot_prediction_log import PredictionLog
+from takealot_sessions import SessionStore, SessionLimitExceeded
+from takealot_export import (EXPORT_FORMATS, available_formats, export_csv_file,
+                             export_frame, export_filename)
+from takealot_charts import (draw_sensitivity_curve, draw_sensitivity_heatmap, draw_shap_bars,
+                             draw_shap_placeholder, get_pyplot, render_png)
+from takealot_metrics import enabled as metrics_enabled, inc, register_gauge, serve, stage
+from takealot_whatif import PAGE_SECONDS, SWEEP_FEATURES, sensitivity_sweep
+from takealot_counterfactual import find_counterfactuals
 
-# Load saved models (data is already scaled, no scaler needed)
-try:
-    kmeans_model = joblib.load("models/kmeans_model.pkl")
-    print("✅ Loaded kmeans_model.pkl")
-    xgb_model = joblib.load("models/xgboost_model.joblib")
-    print("✅ Loaded xgboost_model.joblib")
-    explainer = shap.TreeExplainer(xgb_model)
-    models_loaded = True
-    print("🎉 All models loaded successfully! (No scaling required)")
-except FileNotFoundError as e:
-    print(f"❌ Model loading error: {e}")
-    models_loaded = False
-except Exception as e:
-    print(f"❌ Unexpected error loading models: {e}")
-    models_loaded = False
+# Saved models (data is already scaled, no scaler needed) are loaded lazily by the
+# registry; warming starts in the background so the UI can be served immediately
+models = ModelRegistry()
+models.warm(get_pyplot)
 
 # Feature descriptions - Updated to match all model features
 feature_descriptions = {
@@ -42,9 +47,16 @@ feature_descriptions = {
     "weekend": "Whether session occurred on weekend (0=weekday, 1=weekend)",
     "month": "Month of the session (1-12)",
     "visitor_type": "Type of visitor (New, Returning, Other)",
-    "traffic_type": "Source of traffic (Direct, Search, Social, etc.)"
+    "traffic_type": "Source of traffic (Direct, Search, Social, etc.)",
+    "threshold": "Purchase probability above which a customer is labelled likely to purchase"
 }
 
+# Single-customer analysis runs when "Analyze Customer" is clicked, or - with
+# auto-analysis on - once the inputs below have been left alone this long
+ANALYSIS_DEBOUNCE_SECONDS = 0.8
+ANALYSIS_INPUTS = ("admin", "prod", "informational", "bounce", "exit", "pageval", "special_day",
+                   "weekend", "month", "visitor_type", "traffic_type", "intensity", "threshold")
+
 # Super Modern Glassmorphic UI with Dataset Support
 app_ui = ui.page_fillable(
     
@@ -473,6 +485,15 @@ app_ui = ui.page_fillable(
                                 ui.tags.label("Interaction Intensity", class_="form-label"),
                                 ui.input_slider("intensity", None, min=0, max=1, value=0.8, step=0.01),
                                 ui.p(feature_descriptions["intensity"], class_="help-text"),
+                                style="margin-bottom: 1.5rem;"
+                            ),
+                            
+                            # Decision Threshold
+                            ui.div(
+                                ui.tags.label("Decision Threshold", class_="form-label"),
+                                ui.input_slider("threshold", None, min=0.05, max=0.95, 
+                                              value=DEFAULT_DECISION_THRESHOLD, step=0.05),
+                                ui.p(feature_descriptions["threshold"], class_="help-text"),
                                 style="margin-bottom: 2rem;"
                             ),
                             
@@ -481,6 +502,14 @@ app_ui = ui.page_fillable(
                                                  class_="glass-btn", 
                                                  style="width: 100%;"),
                             
+                            # Optional debounced re-analysis while editing
+                            ui.div(
+                                ui.input_checkbox("auto_analyze", "⚡ Re-analyze as I edit", value=False),
+                                ui.p(f"Runs {ANALYSIS_DEBOUNCE_SECONDS:g}s after the last change instead of on every keystroke",
+                                     class_="help-text"),
+                                style="margin-top: 1rem;"
+                            ),
+                            
                             class_="glass-card-body"
                         ),
                         class_="glass-card"
@@ -500,7 +529,7 @@ app_ui = ui.page_fillable(
                         ui.column(6,
                             ui.div(
                                 ui.div("🧠 AI Feature Analysis", class_="glass-card-header"),
-                                ui.div(ui.output_image("shap_plot"), class_="glass-card-body"),
+                                ui.div(ui.output_ui("shap_plot"), class_="glass-card-body"),
                                 class_="glass-card"
                             )
                         ),
@@ -518,6 +547,45 @@ app_ui = ui.page_fillable(
                         ui.div("💡 AI-Powered Insights", class_="glass-card-header"),
                         ui.div(ui.output_ui("insights_panel"), class_="glass-card-body"),
                         class_="glass-card"
+                    ),
+                    
+                    # What-if sensitivity: one or two features swept around the current inputs
+                    ui.div(
+                        ui.div("🎛️ What-if Sensitivity", class_="glass-card-header"),
+                        ui.div(
+                            ui.row(
+                                ui.column(5,
+                                    ui.input_select("sweep_x", "Sweep Feature:",
+                                                   choices={name: label for name, (label, _, _) in SWEEP_FEATURES.items()},
+                                                   selected="PageValues")
+                                ),
+                                ui.column(5,
+                                    ui.input_select("sweep_y", "Second Feature (heatmap):",
+                                                   choices={"": "None (curve)",
+                                                            **{name: label for name, (label, _, _) in SWEEP_FEATURES.items()}},
+                                                   selected="")
+                                ),
+                                ui.column(2,
+                                    ui.input_action_button("sweep_btn", "📈 Run Sweep", class_="glass-btn",
+                                                         style="width: 100%; margin-top: 1.9rem;")
+                                )
+                            ),
+                            ui.output_ui("sensitivity_plot"),
+                            class_="glass-card-body"
+                        ),
+                        class_="glass-card"
+                    ),
+                    
+                    # Counterfactuals: small controllable changes that flip the prediction
+                    ui.div(
+                        ui.div("🧭 What Would Flip This Customer?", class_="glass-card-header"),
+                        ui.div(
+                            ui.input_action_button("counterfactual_btn", "🔎 Find Flipping Changes",
+                                                 class_="glass-btn", style="margin-bottom: 1rem;"),
+                            ui.output_ui("counterfactual_panel"),
+                            class_="glass-card-body"
+                        ),
+                        class_="glass-card"
                     )
                 )
             )
@@ -547,9 +615,18 @@ app_ui = ui.page_fillable(
                             ui.h5("Analysis Settings:", style="color: white; margin: 1.5rem 0 1rem;"),
                             ui.input_numeric("sample_size", "Sample Size (0 = all):", 
                                            value=100, min=0, max=5000, step=50),
+                            ui.input_slider("batch_threshold", "Decision Threshold:", 
+                                          min=0.05, max=0.95, value=DEFAULT_DECISION_THRESHOLD, step=0.05),
+                            ui.input_checkbox("explain_batch", "🧠 Explain results (top SHAP drivers)", value=False),
+                            ui.input_numeric("explain_rows", "Max Rows to Explain:", 
+                                           value=DEFAULT_EXPLAIN_ROWS, min=100, max=100000, step=100),
                             ui.input_action_button("analyze_batch", "🚀 Run Analysis", 
                                                  class_="glass-btn",
                                                  style="width: 100%; margin-top: 1rem;"),
+                            ui.input_action_button("cancel_batch", "⛔ Cancel Analysis", 
+                                                 class_="glass-btn",
+                                                 style="width: 100%; margin-top: 1rem;"),
+                            ui.output_ui("batch_job_status"),
                             
                             class_="glass-card-body"
                         ),
@@ -591,6 +668,8 @@ app_ui = ui.page_fillable(
             ui.div(
                 ui.div("📥 Download Center", class_="glass-card-header"),
                 ui.div(
+                    ui.input_select("export_format", "Export Format:", choices=available_formats(),
+                                    selected="csv"),
                     ui.row(
                         ui.column(4,
                             ui.div(
@@ -622,13 +701,101 @@ app_ui = ui.page_fillable(
     )
 )
 
-# Store results globally
-results_log = []
-batch_analysis_results = []
-current_dataset = None
+# In-memory results (dataset previews, batch summaries, prediction logs) belong to
+# each session, are capped per session and are released when it disconnects
+MAX_SESSION_BYTES = 256 * 1024 ** 2
+sessions = SessionStore(max_session_bytes=MAX_SESSION_BYTES)
+
+# Rows parsed from an uploaded dataset for the overview/preview panels
+DATASET_PREVIEW_ROWS = 1000
+
+# Batch jobs run off the event loop; extra submissions wait in the queue
+BATCH_JOB_WORKERS = 1
+BATCH_POLL_SECONDS = 0.5
+batch_runner = BatchJobRunner(max_workers=BATCH_JOB_WORKERS)
+
+# Worker processes for multi-core scoring of datasets larger than one chunk
+BATCH_SCORING_WORKERS = os.cpu_count() or 1
+
+# Batch result files live in a managed directory bounded by total size and age;
+# each session's files are deleted when it disconnects
+ARTIFACT_MAX_BYTES = 2 * 1024 ** 3
+ARTIFACT_MAX_AGE_SECONDS = 6 * 3600
+artifacts = ArtifactStore(max_bytes=ARTIFACT_MAX_BYTES, max_age_seconds=ARTIFACT_MAX_AGE_SECONDS)
+artifacts.sweep_orphans()
+
+# Parsed feature matrices of datasets already scored once, keyed by file content and
+# memory-mapped on reuse, so re-loading the same CSV skips parsing entirely
+FEATURE_CACHE_MAX_BYTES = 1024 ** 3
+feature_cache = FeatureCache(max_bytes=FEATURE_CACHE_MAX_BYTES)
+
+# Scored partitions are checkpointed by content, so a failed or cancelled run resumes
+# where it stopped and re-running an edited file only re-scores the changed chunks
+CHECKPOINT_MAX_BYTES = 2 * 1024 ** 3
+checkpoints = CheckpointStore(max_bytes=CHECKPOINT_MAX_BYTES)
+
+# Each session keeps its own prediction log, capped at the most recent rows
+PREDICTION_LOG_MAX_ROWS = 10_000
+PREDICTION_LOG_COLUMNS = ([(name, "float") for name in KMEANS_FEATURES] +
+                          [("Cluster", "category"), ("ClusterID", "int"),
+                           ("PurchaseIntent", "category"), ("PurchaseProbability", "float"),
+                           ("Timestamp", "datetime")])
+
+# Single-customer results shared across sessions, keyed by the feature vector
+PREDICTION_CACHE_SIZE = 1024
+PREDICTION_CACHE_TTL_SECONDS = 3600
+prediction_cache = PredictionCache(max_entries=PREDICTION_CACHE_SIZE,
+                                   ttl_seconds=PREDICTION_CACHE_TTL_SECONDS)
+
+# Counterfactual searches stop after this long and report the best changes found so far
+COUNTERFACTUAL_TIME_BUDGET_SECONDS = 1.0
+
+# Rendered SHAP charts as PNG data URIs: the placeholder is drawn once per process and
+# real charts are keyed by the SHAP vector rounded to the 3 decimals shown on the bars
+SHAP_CHART_CACHE_SIZE = 256
+SHAP_CHART_DECIMALS = 3
+shap_chart_cache = PredictionCache(max_entries=SHAP_CHART_CACHE_SIZE, ttl_seconds=0)
+PLACEHOLDER_CHART_KEY = "placeholder"
+
+# Opt-in metrics (TAKEALOT_METRICS=1): stage timings and counters are recorded by the
+# code below, memory and disk usage is sampled whenever /metrics is scraped
+register_gauge("active_sessions", "Connected dashboard sessions.",
+               lambda: sessions.stats()["sessions"])
+register_gauge("session_memory_bytes", "Per-session results held in memory, in bytes.",
+               lambda: sessions.stats()["bytes_total"])
+register_gauge("disk_bytes", "Bytes on disk per managed store.",
+               lambda: {"artifacts": artifacts.stats()["bytes_on_disk"],
+                        "feature_cache": feature_cache.stats()["bytes_on_disk"],
+                        "checkpoints": checkpoints.stats()["bytes_on_disk"]},
+               label="store")
+register_gauge("cache_entries", "Entries held per in-memory cache.",
+               lambda: {"prediction": prediction_cache.stats()["entries"],
+                        "shap_chart": shap_chart_cache.stats()["entries"]},
+               label="cache")
+METRICS_PORT = os.environ.get("TAKEALOT_METRICS_PORT")
+metrics_server = None
+
+def start_metrics_server():
+    # Started by the first session rather than at import: `shiny run --reload` and
+    # spawn-started worker processes import this module again, and would rebind the port
+    global metrics_server
+    if metrics_server is None and metrics_enabled() and METRICS_PORT:
+        metrics_server = serve(int(METRICS_PORT))
+        if metrics_server is None:
+            print(f"⚠️ Metrics port {METRICS_PORT} is in use; retrying with the next session")
+        else:
+            print(f"📈 Metrics served at http://127.0.0.1:{METRICS_PORT}/metrics")
 
 def server(input, output, session):
     
+    start_metrics_server()
+    state = sessions.open(session.id)
+    
+    # Predictions made in this session, for the export tab
+    results_log = state.put("prediction_log",
+                            PredictionLog(PREDICTION_LOG_COLUMNS, max_rows=PREDICTION_LOG_MAX_ROWS))
+    results_log_version = reactive.Value(0)
+    
     # Reactive function to prepare input data - Flexible for both models
     @reactive.Calc
     def prepare_input():
@@ -638,9 +805,9 @@ def server(input, output, session):
         info_duration = input.informational()
         
         # Estimate page counts based on duration (rough approximation)
-        admin_pages = max(1, admin_duration // 30)  # ~30 seconds per admin page
-        prod_pages = max(1, prod_duration // 45)    # ~45 seconds per product page  
-        info_pages = max(1, info_duration // 60)    # ~60 seconds per info page
+        admin_pages = max(1, admin_duration // PAGE_SECONDS["Administrative"])  # ~30 seconds per admin page
+        prod_pages = max(1, prod_duration // PAGE_SECONDS["ProductRelated"])    # ~45 seconds per product page  
+        info_pages = max(1, info_duration // PAGE_SECONDS["Informational"])     # ~60 seconds per info page
         
         # Calculate total duration
         total_duration = admin_duration + prod_duration + info_duration
@@ -696,39 +863,79 @@ def server(input, output, session):
         
         return kmeans_features
     
-    # Load dataset reactive
+    # Resolve the CSV path of the active dataset (uploaded file or demo file)
     @reactive.Calc
-    def get_dataset():
-        global current_dataset
-        
-        # Check if user uploaded a file
+    def get_dataset_path():
         if input.dataset_file() is not None:
-            try:
-                file_info = input.dataset_file()[0]
-                df = pd.read_csv(file_info["datapath"])
-                current_dataset = df
-                return df
-            except Exception as e:
-                return pd.DataFrame({"Error": [f"Failed to load file: {str(e)}"]})
-        
-        # Check if user clicked load existing
+            return input.dataset_file()[0]["datapath"]
         elif input.load_existing() > 0:
-            try:
-                # Try to load the existing dataset
-                df = pd.read_csv("online_shoppers_Intention_cleaned.csv")
-                current_dataset = df
-                return df
-            except FileNotFoundError:
-                return pd.DataFrame({"Error": ["online_shoppers_Intention_cleaned.csv not found in current directory"]})
-            except Exception as e:
-                return pd.DataFrame({"Error": [f"Failed to load existing dataset: {str(e)}"]})
-        
+            return "online_shoppers_Intention_cleaned.csv"
         return None
 
+    # Load dataset reactive - only a preview is parsed, batch scoring streams from disk
+    @reactive.Calc
+    def get_dataset():
+        path = get_dataset_path()
+        if path is None:
+            return None
+        
+        try:
+            # Typed read of the feature columns only; bad or missing columns are rejected here.
+            # Only the first rows are parsed and scoring streams, so file size is not capped
+            with stage("dataset_preview"):
+                df = read_features(path, nrows=DATASET_PREVIEW_ROWS)
+            return state.put("dataset_preview", df)
+        except SessionLimitExceeded as e:
+            return pd.DataFrame({"Error": [f"Dataset preview rejected: {e}"]})
+        except ValueError as e:
+            return pd.DataFrame({"Error": [str(e)]})
+        except FileNotFoundError:
+            return pd.DataFrame({"Error": [f"{os.path.basename(path)} not found in current directory"]})
+        except Exception as e:
+            return pd.DataFrame({"Error": [f"Failed to load file: {str(e)}"]})
+
+    # Total data rows in the active dataset, counted without parsing the CSV
+    @reactive.Calc
+    def get_dataset_rows():
+        path = get_dataset_path()
+        if path is None or not os.path.exists(path):
+            return 0
+        return count_csv_rows(path)
+
+    # Bumped by the debounce below; "Analyze Customer" clicks trigger directly
+    analysis_trigger = reactive.Value(0)
+    edited_at = reactive.Value(None)
+    
+    # With auto-analysis on, every edit restarts the debounce window
+    @reactive.Effect
+    def watch_analysis_inputs():
+        if not input.auto_analyze():
+            edited_at.set(None)
+            return
+        for name in ANALYSIS_INPUTS:
+            input[name]()
+        edited_at.set(time.monotonic())
+    
+    # Fires one analysis once the inputs have been still for ANALYSIS_DEBOUNCE_SECONDS
+    @reactive.Effect
+    def debounce_analysis():
+        last_edit = edited_at()
+        if last_edit is None:
+            return
+        remaining = last_edit + ANALYSIS_DEBOUNCE_SECONDS - time.monotonic()
+        if remaining > 0:
+            reactive.invalidate_later(remaining)
+            return
+        edited_at.set(None)
+        with reactive.isolate():
+            analysis_trigger.set(analysis_trigger() + 1)
+    
     # Reactive predictions - Fixed to use correct features for each model
+    # Only an explicit or debounced trigger re-runs the models; inputs are read in isolation
     @reactive.Calc  
+    @reactive.event(input.predict_btn, analysis_trigger, ignore_none=False)
     def get_predictions():
-        if input.predict_btn() == 0 or not models_loaded:
+        if (input.predict_btn() == 0 and analysis_trigger() == 0) or models.failed:
             return None
             
         try:
@@ -736,29 +943,52 @@ def server(input, output, session):
             xgb_data = prepare_input()  # 20 features for XGBoost
             kmeans_data = prepare_kmeans_input()  # 9 features for KMeans
             
-            print(f"XGBoost data shape: {xgb_data.shape}")
-            print(f"XGBoost data columns: {xgb_data.columns.tolist()}")
-            print(f"KMeans data shape: {kmeans_data.shape}")
-            print(f"KMeans data columns: {kmeans_data.columns.tolist()}")
+            # Identical feature vectors reuse cached model outputs (cluster, probability, SHAP)
+            xgb_vector = xgb_data.to_numpy(dtype=np.float32)[0]
+            cache_key = feature_key(xgb_vector)
+            cached = prediction_cache.get(cache_key)
+            inc("prediction_cache_total", help="Single-customer prediction cache lookups.",
+                result="miss" if cached is None else "hit")
             
-            # Cluster prediction using KMeans features
-            cluster = kmeans_model.predict(kmeans_data)[0]
+            if cached is None:
+                # Cluster prediction using KMeans features (nearest centroid, no DataFrame overhead)
+                with stage("kmeans_predict"):
+                    cluster = nearest_cluster(models.kmeans(), kmeans_data.to_numpy()[0])
+                
+                # Purchase probability using XGBoost features - array-backed fast path
+                # when available, otherwise a single booster pass through the sklearn wrapper
+                with stage("xgb_predict"):
+                    fast_xgb = models.fast_xgb()
+                    if fast_xgb is not None:
+                        purchase_prob = fast_xgb.predict_proba_row(xgb_vector)
+                    else:
+                        purchase_prob = float(predict_intent(models.xgb(), xgb_data)[0][0])
+                
+                # SHAP values using XGBoost features
+                with stage("shap_values"):
+                    shap_values = models.explainer().shap_values(xgb_data)[0]
+                shap_values.setflags(write=False)
+                
+                cached = {'cluster': cluster, 'purchase_prob': purchase_prob, 'shap_values': shap_values}
+                prediction_cache.put(cache_key, cached)
+            
+            cluster = cached['cluster']
             cluster_label = "High-Intent Shoppers" if cluster == 0 else "Casual Browsers"
             
-            # Purchase intent prediction using XGBoost features
-            purchase_prob = xgb_model.predict_proba(xgb_data)[0][1]
-            purchase_pred = xgb_model.predict(xgb_data)[0]
+            # The label is derived per request so one cache entry serves every threshold
+            purchase_prob = cached['purchase_prob']
+            purchase_pred = int(purchase_prob > input.threshold())
             intent_label = "Likely to Purchase" if purchase_pred == 1 else "Unlikely to Purchase"
-            
-            # SHAP values using XGBoost features
-            shap_values = explainer.shap_values(xgb_data)
+            shap_values = cached['shap_values']
+            inc("predictions_total", help="Single-customer predictions served.")
             
             return {
                 'cluster': cluster,
                 'cluster_label': cluster_label,
                 'purchase_prob': purchase_prob,
+                'purchase_pred': purchase_pred,
                 'intent_label': intent_label,
-                'shap_values': shap_values[0],
+                'shap_values': shap_values,
                 'input_data': xgb_data,  # Use full feature set for display
                 'kmeans_data': kmeans_data
             }
@@ -818,9 +1048,9 @@ def server(input, output, session):
                 class_="metric-card danger"
             )
         
-        emoji = "✅" if pred['purchase_prob'] > 0.5 else "❌"
+        emoji = "✅" if pred['purchase_pred'] == 1 else "❌"
         prob_percent = f"{pred['purchase_prob']*100:.1f}%"
-        card_class = "metric-card success" if pred['purchase_prob'] > 0.5 else "metric-card warning"
+        card_class = "metric-card success" if pred['purchase_pred'] == 1 else "metric-card warning"
         
         return ui.div(
             ui.span(emoji, class_="metric-icon"),
@@ -848,17 +1078,13 @@ def server(input, output, session):
             )
         
         # Dataset statistics
-        rows, cols = dataset.shape
-        required_cols = ["Administrative", "Administrative_Duration", "Informational", 
-                        "Informational_Duration", "ProductRelated", "ProductRelated_Duration",
-                        "BounceRates", "ExitRates", "PageValues", "SpecialDay", "Month",
-                        "OperatingSystems", "Browser", "Region", "TrafficType", "Weekend",
-                        "VisitorType_Other", "VisitorType_Returning_Visitor", "Total_Duration", 
-                        "Interaction_Intensity"]
-        missing_cols = [col for col in required_cols if col not in dataset.columns]
+        rows, cols = get_dataset_rows(), dataset.shape[1]
+        missing_cols = [col for col in XGB_FEATURES if col not in dataset.columns]
         
         status_color = "#4ade80" if len(missing_cols) == 0 else "#fbbf24"
         status_text = "All required columns present" if len(missing_cols) == 0 else f"Missing: {missing_cols}"
+        if is_raw_export(read_header(get_dataset_path())):
+            status_text = "Raw session export - features are engineered during scoring"
         
         return ui.div(
             ui.h5("✅ Dataset Loaded Successfully", style="color: #4ade80; margin-bottom: 1rem;"),
@@ -875,13 +1101,7 @@ def server(input, output, session):
             return pd.DataFrame({"Message": ["No valid dataset to preview"]})
         
         # Show first 10 rows of relevant columns  
-        required_cols = ["Administrative", "Administrative_Duration", "Informational", 
-                        "Informational_Duration", "ProductRelated", "ProductRelated_Duration",
-                        "BounceRates", "ExitRates", "PageValues", "SpecialDay", "Month",
-                        "OperatingSystems", "Browser", "Region", "TrafficType", "Weekend",
-                        "VisitorType_Other", "VisitorType_Returning_Visitor", "Total_Duration", 
-                        "Interaction_Intensity"]
-        available_cols = [col for col in required_cols if col in dataset.columns]
+        available_cols = [col for col in XGB_FEATURES if col in dataset.columns]
         
         if len(available_cols) > 0:
             preview_df = dataset[available_cols].head(10).round(3)
@@ -889,85 +1109,173 @@ def server(input, output, session):
         else:
             return pd.DataFrame({"Message": ["Required columns not found in dataset"]})
     
-    # Batch analysis - Fixed to use correct features for each model
+    # Bumped after each batch run so the results panels re-render
+    batch_version = reactive.Value(0)
+    
+    # The session's most recent background batch job and its output file
+    batch_job = reactive.Value(None)
+    batch_job_outputs = {}
+    
+    # Batch analysis - queues a background job that streams the CSV in chunks
     @reactive.Effect
     @reactive.event(input.analyze_batch)
     def run_batch_analysis():
-        global batch_analysis_results
         dataset = get_dataset()
         
-        if dataset is None or "Error" in dataset.columns or not models_loaded:
+        if dataset is None or "Error" in dataset.columns or models.failed:
             return
         
-        try:
-            # Get required columns for both models - CORRECT ORDER
-            xgb_cols = ["Administrative", "Administrative_Duration", "Informational", 
-                       "Informational_Duration", "ProductRelated", "ProductRelated_Duration",
-                       "BounceRates", "ExitRates", "PageValues", "SpecialDay", "Month",
-                       "OperatingSystems", "Browser", "Region", "TrafficType", "Weekend",
-                       "VisitorType_Other", "VisitorType_Returning_Visitor", "Total_Duration", 
-                       "Interaction_Intensity"]
-                       
-            kmeans_cols = ["Administrative_Duration", "ProductRelated_Duration", 
-                          "Informational_Duration", "BounceRates", "ExitRates", 
-                          "PageValues", "SpecialDay", "Weekend", "Interaction_Intensity"]
-            
-            # Check if we have the required columns
-            missing_xgb = [col for col in xgb_cols if col not in dataset.columns]
-            missing_kmeans = [col for col in kmeans_cols if col not in dataset.columns]
+        # Only one job per session at a time
+        current_job = batch_job()
+        if current_job is not None and not current_job.done:
+            return
+        
+        # Check if we have the required columns before touching the whole file
+        missing_xgb, missing_kmeans = missing_columns(dataset.columns)
+        if missing_xgb:
+            print(f"Missing XGBoost columns: {missing_xgb}")
+            return
+        if missing_kmeans:
+            print(f"Missing KMeans columns: {missing_kmeans}")
+            return
+        
+        # Each job writes its own file so a running job never clobbers downloadable results
+        output_path = artifacts.new_path(session.id, prefix="takealot_batch", suffix=".csv")
+        
+        # Sample data if requested
+        sample_size = input.sample_size() or 0
+        options = dict(chunk_size=DEFAULT_CHUNK_SIZE,
+                       sample_size=sample_size,
+                       threshold=input.batch_threshold(),
+                       explain_rows=(input.explain_rows() or 0) if input.explain_batch() else 0,
+                       feature_cache=feature_cache,
+                       checkpoints=checkpoints,
+                       model_key=model_files_key(models.kmeans_path, models.xgb_path),
+                       description="Batch analysis")
+        
+        # Large inputs are partitioned across worker processes; small ones score in-thread
+        rows_to_score = min(sample_size, get_dataset_rows()) if sample_size > 0 else get_dataset_rows()
+        if BATCH_SCORING_WORKERS > 1 and rows_to_score > DEFAULT_CHUNK_SIZE:
+            job = batch_runner.submit(parallel_score_csv, get_dataset_path(), output_path,
+                                      workers=BATCH_SCORING_WORKERS,
+                                      kmeans_path=models.kmeans_path, xgb_path=models.xgb_path,
+                                      **options)
+        else:
+            # Models are fetched inside the job so a cold start never blocks the event loop
+            def score_in_thread(input_path, output_path, **kwargs):
+                explainer = models.explainer() if kwargs["explain_rows"] > 0 else None
+                return stream_score_csv(input_path, output_path, models.kmeans(), models.xgb(),
+                                        explainer=explainer, **kwargs)
             
-            if missing_xgb:
-                print(f"Missing XGBoost columns: {missing_xgb}")
-                return
-            if missing_kmeans:
-                print(f"Missing KMeans columns: {missing_kmeans}")
+            job = batch_runner.submit(score_in_thread, get_dataset_path(), output_path, **options)
+        batch_job_outputs[job.job_id] = output_path
+        batch_job.set(job)
+    
+    # Stop the session's batch job and free its files and memory when the browser disconnects
+    def release_session():
+        with reactive.isolate():
+            job = batch_job()
+        if job is not None and not job.done:
+            job.cancel()
+            # A running job may append one more chunk before it stops, so sweep again then
+            job.add_done_callback(lambda _: artifacts.release_owner(session.id))
+        artifacts.release_owner(session.id)
+        sessions.release(session.id)
+    
+    session.on_ended(release_session)
+    
+    # Cancel the session's running or queued batch job
+    @reactive.Effect
+    @reactive.event(input.cancel_batch)
+    def cancel_batch_analysis():
+        job = batch_job()
+        if job is not None and not job.done:
+            job.cancel()
+    
+    # Poll the background job and publish its results once it completes
+    @reactive.Effect
+    def collect_batch_job():
+        job = batch_job()
+        if job is None:
+            return
+        
+        if not job.done:
+            reactive.invalidate_later(BATCH_POLL_SECONDS)
+            return
+        
+        if job.status == FINISHED:
+            batch_job_outputs.pop(job.job_id, None)
+            artifacts.finish(job.result["output_path"])
+            previous = state.get("batch_summary")
+            try:
+                state.put("batch_summary", job.result)
+            except SessionLimitExceeded as e:
+                print(f"Batch analysis error: {e}")
+                artifacts.release(job.result["output_path"])
                 return
-            
-            # Sample data if requested
-            sample_size = input.sample_size()
-            if sample_size > 0 and sample_size < len(dataset):
-                analysis_data = dataset.sample(n=sample_size, random_state=42)
-            else:
-                analysis_data = dataset
-            
-            # Prepare features for each model
-            xgb_features = analysis_data[xgb_cols]
-            kmeans_features = analysis_data[kmeans_cols]
-            
-            # Run predictions with appropriate features
-            clusters = kmeans_model.predict(kmeans_features)
-            purchase_probs = xgb_model.predict_proba(xgb_features)[:, 1]
-            purchase_preds = xgb_model.predict(xgb_features)
-            
-            # Create results dataframe
-            results_df = analysis_data.copy()
-            results_df["Cluster"] = clusters
-            results_df["ClusterLabel"] = ["High-Intent" if c == 0 else "Casual Browser" for c in clusters]
-            results_df["PurchaseProbability"] = purchase_probs
-            results_df["PurchaseIntent"] = ["Likely" if p == 1 else "Unlikely" for p in purchase_preds]
-            results_df["Timestamp"] = datetime.now().isoformat()
-            
-            batch_analysis_results = [results_df]
-            
-        except Exception as e:
-            print(f"Batch analysis error: {e}")
+            if previous is not None:
+                artifacts.release(previous["output_path"])
+            with reactive.isolate():
+                batch_version.set(batch_version() + 1)
+        else:
+            # Drop the partial output of failed or cancelled jobs
+            output_path = batch_job_outputs.pop(job.job_id, None)
+            if output_path:
+                artifacts.release(output_path)
+            if job.status == FAILED:
+                print(f"Batch analysis error: {job.error}")
+    
+    # Live status of the session's batch job
+    @output
+    @render.ui
+    def batch_job_status():
+        job = batch_job()
+        if job is None:
+            return ui.div()
+        
+        if not job.done:
+            reactive.invalidate_later(BATCH_POLL_SECONDS)
+        
+        status_colors = {FINISHED: "#4ade80", FAILED: "#ff6b6b", CANCELLED: "#fbbf24"}
+        detail = f"{job.rows_done:,} / {job.total_rows:,} rows" if job.total_rows else ""
+        if job.status == FAILED:
+            detail = job.error
+        if job.status in (FAILED, CANCELLED) and job.rows_done:
+            detail = f"{detail} - finished chunks are saved; run the analysis again to resume.".lstrip(" -")
+        
+        return ui.HTML(f"""
+        <div style="margin-top: 1.5rem;">
+            <div style="display: flex; justify-content: space-between; margin-bottom: 0.5rem;">
+                <span style="color: {status_colors.get(job.status, 'white')}; font-weight: 500;">Job #{job.job_id}: {job.status.title()}</span>
+                <span style="color: rgba(255,255,255,0.8);">{job.percent:.0f}%</span>
+            </div>
+            <div class="glass-progress">
+                <div class="glass-progress-bar" style="width: {job.percent}%;"></div>
+            </div>
+            <p class="help-text">{detail}</p>
+        </div>
+        """)
     
     # Batch results display
     @output
     @render.ui  
     def batch_results():
-        if len(batch_analysis_results) == 0:
+        batch_version()
+        summary = state.get("batch_summary")
+        if summary is None:
             return ui.p("No batch analysis results yet. Click 'Run Analysis' to start.", 
                        style="color: rgba(255,255,255,0.8);")
         
-        df = batch_analysis_results[0]
-        total_rows = len(df)
-        
-        # Summary statistics
-        high_intent_count = sum(df["Cluster"] == 0)
-        likely_purchase_count = sum(df["PurchaseIntent"] == "Likely")
-        avg_purchase_prob = df["PurchaseProbability"].mean()
+        total_rows = summary["total_rows"]
+        if total_rows == 0:
+            return ui.p("The dataset contained no rows to analyze.", 
+                       style="color: rgba(255,255,255,0.8);")
         
+        # Summary statistics (accumulated chunk by chunk while scoring)
+        high_intent_count = summary["high_intent_count"]
+        likely_purchase_count = summary["likely_purchase_count"]
+        avg_purchase_prob = summary["avg_purchase_prob"]
+
         return ui.div(
             ui.row(
                 ui.column(3,
@@ -1003,134 +1311,189 @@ def server(input, output, session):
                     )
                 )
             ),
+            batch_checkpoint_note(summary),
+            batch_drivers_summary(summary),
             ui.div(
                 ui.h6("Recent Results Preview:", style="color: white; margin: 1.5rem 0 1rem;"),
                 ui.output_table("batch_preview_table")
             )
         )
     
+    # Rows restored from checkpoints instead of being scored again
+    def batch_checkpoint_note(summary):
+        reused_rows = summary.get("reused_rows", 0)
+        if not reused_rows:
+            return ui.div()
+        return ui.p(f"♻️ {reused_rows:,} of {summary['total_rows']:,} rows were unchanged since an "
+                    f"earlier run and reused from checkpoints.", class_="help-text")
+    
+    # Aggregate mean |SHAP| bars for explained batch rows
+    def batch_drivers_summary(summary):
+        mean_abs_shap = summary.get("mean_abs_shap")
+        if mean_abs_shap is None:
+            return ui.div()
+        
+        top = mean_abs_shap.head(8)
+        bars_html = ""
+        for name, val in top.items():
+            width = val / top.iloc[0] * 100 if top.iloc[0] > 0 else 0
+            bars_html += f"""
+            <div style="margin: 0.75rem 0;">
+                <div style="display: flex; justify-content: space-between; margin-bottom: 0.25rem;">
+                    <span style="color: white; font-weight: 500;">{name.replace('_', ' ')}</span>
+                    <span style="color: rgba(255,255,255,0.8);">{val:.3f}</span>
+                </div>
+                <div class="glass-progress">
+                    <div class="glass-progress-bar" style="width: {width}%;"></div>
+                </div>
+            </div>
+            """
+        
+        return ui.div(
+            ui.h6(f"Top Drivers (mean |SHAP| over {summary['explained_rows']:,} explained rows):", 
+                  style="color: white; margin: 1.5rem 0 1rem;"),
+            ui.HTML(bars_html)
+        )
+    
     # Batch preview table
     @output
     @render.table
     def batch_preview_table():
-        if len(batch_analysis_results) > 0:
-            df = batch_analysis_results[0]
-            return df[["ClusterLabel", "PurchaseIntent", "PurchaseProbability", 
-                      "Administrative_Duration", "ProductRelated_Duration"]].head()
+        batch_version()
+        summary = state.get("batch_summary")
+        if summary is not None and summary["preview"] is not None:
+            df = summary["preview"]
+            columns = ["row", "ClusterLabel", "PurchaseIntent", "PurchaseProbability", 
+                       "Administrative_Duration", "ProductRelated_Duration"]
+            if "Driver1" in df.columns:
+                columns += ["Driver1", "Driver1_SHAP"]
+            return df[columns].head()
         else:
             return pd.DataFrame({"Message": ["No batch results available"]})
     
-    # SHAP plot - Fixed scope and import issues
+    # SHAP plot - rendered off the event loop and cached as an in-memory PNG
     @output
-    @render.image
-    def shap_plot():
+    @render.ui
+    async def shap_plot():
         pred = get_predictions()
         if pred is None or 'error' in pred:
-            # Create a simple placeholder image when no data is available
-            try:
-                import tempfile
-                
-                fig, ax = plt.subplots(figsize=(10, 6))
-                fig.patch.set_facecolor('none')
-                ax.set_facecolor('none')
-                
-                # Create placeholder text with simpler styling
-                ax.text(0.5, 0.5, 'Click "Analyze Customer" to see\nfeature importance analysis', 
-                       horizontalalignment='center', verticalalignment='center',
-                       transform=ax.transAxes, fontsize=16, color='white', 
-                       bbox=dict(boxstyle="round,pad=0.5", facecolor='gray', 
-                                edgecolor='white', alpha=0.3))
-                
-                ax.set_xlim(0, 1)
-                ax.set_ylim(0, 1)
-                ax.axis('off')
-                
-                # Remove all spines and ticks
-                for spine in ax.spines.values():
-                    spine.set_visible(False)
-                ax.set_xticks([])
-                ax.set_yticks([])
-                
-                plt.tight_layout()
-                
-                # Save to temporary file
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-                    plt.savefig(tmp.name, format="png", dpi=150, bbox_inches='tight', 
-                               facecolor='none', edgecolor='none', transparent=True)
-                    plt.close(fig)
-                    temp_filename = tmp.name
-                
-                return {"src": temp_filename, "alt": "SHAP placeholder", "width": "100%"}
-                
-            except Exception as e:
-                print(f"Error creating placeholder: {e}")
-                # Return a completely empty response to avoid file errors
-                return None
-        
-        try:
-            # Create figure with proper settings
-            plt.ioff()  # Turn off interactive mode
-            fig, ax = plt.subplots(figsize=(10, 6))
-            fig.patch.set_facecolor('none')
-            ax.set_facecolor('none')
-            
-            feature_names = prepare_input().columns.tolist()
-            shap_vals = pred['shap_values']
+            key, alt = PLACEHOLDER_CHART_KEY, "SHAP placeholder"
+            draw = draw_shap_placeholder
+        else:
+            feature_names = pred['input_data'].columns.tolist()
+            shap_vals = np.round(pred['shap_values'], SHAP_CHART_DECIMALS)
             
             # Ensure we have the right number of features
             if len(shap_vals) != len(feature_names):
                 print(f"SHAP values length: {len(shap_vals)}, Feature names length: {len(feature_names)}")
-                plt.close(fig)
                 return None
-            
-            colors = ['#ff6b6b' if x < 0 else '#4ade80' for x in shap_vals]
-            
-            y_pos = np.arange(len(feature_names))
-            bars = ax.barh(y_pos, shap_vals, color=colors, alpha=0.8)
-            
-            ax.set_yticks(y_pos)
-            ax.set_yticklabels([name.replace('_', ' ') for name in feature_names], color='white', fontsize=10)
-            ax.set_xlabel('SHAP Value (Impact on Purchase Intent)', color='white', fontsize=12)
-            ax.set_title('AI Feature Importance Analysis', fontsize=14, fontweight='bold', color='white')
-            ax.axvline(x=0, color='white', linestyle='-', alpha=0.3)
-            
-            # Style the plot for glassmorphic theme
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            ax.spines['bottom'].set_color('white')
-            ax.spines['left'].set_color('white')
-            ax.tick_params(colors='white')
-            ax.grid(True, alpha=0.3, color='white')
-            
-            # Add value labels on bars
-            for i, (bar, val) in enumerate(zip(bars, shap_vals)):
-                ax.text(val + (0.01 if val >= 0 else -0.01), i, f'{val:.3f}', 
-                       va='center', ha='left' if val >= 0 else 'right', 
-                       fontweight='bold', color='white', fontsize=9)
-            
-            plt.tight_layout()
-            
-            # Use a different approach for Shiny - save to a temporary file
-            import tempfile
-            
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-                plt.savefig(tmp.name, format="png", dpi=150, bbox_inches='tight', 
-                           facecolor='none', edgecolor='none', transparent=True)
-                plt.close(fig)
-                temp_filename = tmp.name
-            
-            # Return the path to the temporary file
-            return {"src": temp_filename, "alt": "SHAP Feature Importance", "width": "100%"}
-            
-        except Exception as e:
-            print(f"SHAP plot error: {e}")
-            # Clean up any open figures - plt is in scope here since it's imported at module level
+            # + 0.0 folds -0.0 into 0.0 so equal charts share a key
+            key, alt = feature_key(shap_vals + 0.0), "SHAP Feature Importance"
+            draw = lambda ax: draw_shap_bars(ax, feature_names, shap_vals)
+        
+        src = shap_chart_cache.get(key)
+        inc("shap_chart_cache_total", help="SHAP chart cache lookups.",
+            result="miss" if src is None else "hit")
+        if src is None:
             try:
-                plt.close('all')
-            except:
-                pass
+                with stage("render_shap_chart"):
+                    src = await asyncio.to_thread(render_png, draw)
+            except Exception as e:
+                print(f"SHAP plot error: {e}")
+                return None
+            shap_chart_cache.put(key, src)
+        return ui.img(src=src, alt=alt, width="100%")
+    
+    # What-if sweep around the current inputs - the whole grid is one predict_proba call
+    @reactive.Calc
+    @reactive.event(input.sweep_btn, ignore_none=False)
+    def get_sensitivity():
+        if input.sweep_btn() == 0 or models.failed:
             return None
+        features = [input.sweep_x()]
+        if input.sweep_y() and input.sweep_y() != input.sweep_x():
+            features.append(input.sweep_y())
+        try:
+            with stage("sensitivity_sweep", features=len(features)):
+                return sensitivity_sweep(models.xgb(), prepare_input(), features)
+        except Exception as e:
+            print(f"Sensitivity sweep error: {e}")
+            return {'error': str(e)}
+    
+    @output
+    @render.ui
+    async def sensitivity_plot():
+        sweep = get_sensitivity()
+        if sweep is None:
+            return ui.p('Pick a feature (and optionally a second one) and click "Run Sweep" to see how '
+                        'the purchase probability responds around the current inputs.', class_="help-text")
+        if 'error' in sweep:
+            return ui.p(f"Sweep failed: {sweep['error']}", style="color: #ff6b6b;")
+        
+        # The threshold only moves the reference line, so it does not re-render the chart
+        with reactive.isolate():
+            threshold = input.threshold()
+        labels = [SWEEP_FEATURES[name][0] for name in sweep['features']]
+        if len(labels) == 1:
+            draw = lambda ax: draw_sensitivity_curve(ax, sweep, labels[0], threshold)
+        else:
+            draw = lambda ax: draw_sensitivity_heatmap(ax, sweep, labels, threshold)
+        try:
+            with stage("render_sensitivity_chart"):
+                src = await asyncio.to_thread(render_png, draw)
+        except Exception as e:
+            print(f"Sensitivity plot error: {e}")
+            return None
+        return ui.div(
+            ui.img(src=src, alt="What-if sensitivity", width="100%"),
+            ui.p(f"{sweep['rows_scored']:,} what-if scenarios scored in one call "
+                 f"({sweep['score_seconds'] * 1000:.0f} ms)", class_="help-text")
+        )
+    
+    # Counterfactual search around the current inputs, run off the event loop on click
+    def format_change(name, old, new):
+        label = SWEEP_FEATURES[name][0]
+        fmt = "{:,.1f}" if name.endswith("_Duration") else "{:.3f}" if name == "ExitRates" else "{:,.2f}"
+        return f"{label}: {fmt.format(old)} → {fmt.format(new)}"
+    
+    @output
+    @render.ui
+    @reactive.event(input.counterfactual_btn, ignore_none=False)
+    async def counterfactual_panel():
+        if input.counterfactual_btn() == 0:
+            return ui.p('For customers predicted "Unlikely", finds small changes to page value, '
+                        'durations and exit rate that the model would score as "Likely".', class_="help-text")
+        if models.failed:
+            return ui.p("Models are unavailable", style="color: #ff6b6b;")
+        try:
+            base = prepare_input()
+            threshold = input.threshold()
+            # The split thresholds come from the flat ensemble, built once per process and
+            # (like the search) off the event loop
+            def search_counterfactuals():
+                return find_counterfactuals(models.xgb(), models.flat_xgb(), base, threshold=threshold,
+                                            time_budget=COUNTERFACTUAL_TIME_BUDGET_SECONDS)
+            with stage("counterfactual_search"):
+                search = await asyncio.to_thread(search_counterfactuals)
+        except Exception as e:
+            print(f"Counterfactual search error: {e}")
+            return ui.p(f"Search failed: {e}", style="color: #ff6b6b;")
+        
+        footer = ui.p(f"{search['rows_scored']:,} candidate changes scored in {search['seconds'] * 1000:.0f} ms"
+                      + ("" if search['complete'] else " (time budget reached)"), class_="help-text")
+        if search['base_probability'] > threshold:
+            return ui.div(f"✅ Already likely to purchase ({search['base_probability']:.1%}) - "
+                          f"no change needed", class_="insight-item")
+        if not search['counterfactuals']:
+            message = ("🤷 No change to page value, durations or exit rate within the input ranges "
+                       "flips this customer" if search['complete'] else
+                       "⏱️ No flipping change found within the time budget")
+            return ui.div(ui.div(message, class_="insight-item"), footer)
+        items = [ui.div(ui.strong(f"Option {i}: "), "; ".join(format_change(*change) for change in cf['changes']),
+                        f" ({cf['probability']:.1%} purchase probability)", class_="insight-item")
+                 for i, cf in enumerate(search['counterfactuals'], 1)]
+        return ui.div(ui.p(f"Currently {search['base_probability']:.1%} - changes found that reach "
+                           f"{threshold:.0%}:", class_="help-text"), *items, footer)
     
     # Radar chart for input visualization
     @output
@@ -1264,8 +1627,11 @@ def server(input, output, session):
     @output
     @render.ui
     def summary_stats():
+        batch_version()
+        results_log_version()
         single_count = len(results_log)
-        batch_count = len(batch_analysis_results[0]) if len(batch_analysis_results) > 0 else 0
+        summary = state.get("batch_summary")
+        batch_count = summary["total_rows"] if summary is not None else 0
         
         return ui.row(
             ui.column(4,
@@ -1299,43 +1665,50 @@ def server(input, output, session):
     def log_prediction():
         pred = get_predictions()
         if pred and 'error' not in pred:
-            record = prepare_kmeans_input().copy()  # Use KMeans features for consistency
-            record["Cluster"] = [pred['cluster_label']]
-            record["ClusterID"] = [pred['cluster']]
-            record["PurchaseIntent"] = [pred['intent_label']]
-            record["PurchaseProbability"] = [f"{pred['purchase_prob']:.3f}"]
-            record["Timestamp"] = [datetime.now().isoformat()]
+            record = pred['kmeans_data'].iloc[0].to_dict()  # Use KMeans features for consistency
+            record["Cluster"] = pred['cluster_label']
+            record["ClusterID"] = pred['cluster']
+            record["PurchaseIntent"] = pred['intent_label']
+            record["PurchaseProbability"] = pred['purchase_prob']
+            record["Timestamp"] = datetime.now()
             results_log.append(record)
+            state.resize("prediction_log")
+            with reactive.isolate():
+                results_log_version.set(results_log_version() + 1)
     
     # FIXED DOWNLOAD FUNCTIONS - Using proper file handling
-    @render.download(filename=lambda: f"takealot_predictions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    # Downloads stream in the chosen format (CSV, gzip CSV or Parquet) chunk by chunk
+    def export_name(stem):
+        return export_filename(f"{stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}", input.export_format())
+    
+    def export_media_type():
+        return EXPORT_FORMATS[input.export_format()][2]
+    
+    @render.download(filename=lambda: export_name("takealot_predictions"), media_type=export_media_type)
     def download_predictions():
-        def write_csv():
-            if results_log:
-                df = pd.concat(results_log, ignore_index=True)
-                yield df.to_csv(index=False)
-            else:
-                # Return empty CSV with headers when no data
-                empty_df = pd.DataFrame(columns=["Administrative_Duration", "ProductRelated_Duration", 
-                                               "Informational_Duration", "BounceRates", "ExitRates", 
-                                               "PageValues", "SpecialDay", "Weekend", "Interaction_Intensity",
-                                               "Cluster", "ClusterID", "PurchaseIntent", "PurchaseProbability", "Timestamp"])
-                yield empty_df.to_csv(index=False)
-        
-        return write_csv()
+        # One frame straight from the column buffers; headers only when the log is empty
+        df = results_log.to_frame()
+        fmt = input.export_format()
+        inc("downloads_total", help="Files downloaded, by kind and format.", kind="predictions", format=fmt)
+        if fmt == "parquet":
+            return export_frame(df, fmt)
+        # Text formats keep the 3-decimal probability and ISO timestamps
+        df["PurchaseProbability"] = np.char.mod("%.3f", df["PurchaseProbability"].to_numpy())
+        return export_frame(df, fmt, date_format="%Y-%m-%dT%H:%M:%S.%f")
     
-    @render.download(filename=lambda: f"takealot_batch_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    @render.download(filename=lambda: export_name("takealot_batch_results"), media_type=export_media_type)
     def download_batch():
-        def write_csv():
-            if len(batch_analysis_results) > 0:
-                yield batch_analysis_results[0].to_csv(index=False)
-            else:
-                # Return empty CSV with basic headers when no data
-                empty_df = pd.DataFrame(columns=["ClusterLabel", "PurchaseIntent", "PurchaseProbability", 
-                                               "Administrative_Duration", "ProductRelated_Duration", "Timestamp"])
-                yield empty_df.to_csv(index=False)
-        
-        return write_csv()
+        summary = state.get("batch_summary")
+        inc("downloads_total", help="Files downloaded, by kind and format.", kind="batch",
+            format=input.export_format())
+        if summary is not None and os.path.exists(summary["output_path"]):
+            # Convert the scored file on disk block by block instead of loading it
+            return export_csv_file(summary["output_path"], input.export_format())
+        
+        # Return empty CSV with basic headers when no data
+        empty_df = pd.DataFrame(columns=["ClusterLabel", "PurchaseIntent", "PurchaseProbability", 
+                                       "Administrative_Duration", "ProductRelated_Duration", "Timestamp"])
+        return export_frame(empty_df, input.export_format())
     
     @render.download(filename=lambda: f"takealot_analysis_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
     def download_report():
@@ -1391,7 +1764,7 @@ Generated by Takealot Customer Analytics Dashboard
                     "=== FEATURE IMPORTANCE (SHAP VALUES) ==="
                 ]
                 
-                feature_names = prepare_input().columns.tolist()
+                feature_names = pred['input_data'].columns.tolist()
                 for name, shap_val in zip(feature_names, pred['shap_values']):
                     impact = "Positive" if shap_val > 0 else "Negative"
                     report_lines.append(f"{name}: {shap_val:.4f} ({impact} impact)")
@@ -0,0 +1,134 @@
+"""
+Managed on-disk store for files the app generates (batch result CSVs).
+
+Every file lives in one directory under the system temp dir and is owned by a
+session. Files are removed when their session ends, and the store evicts
+finished files by age and then oldest-first until it fits a byte budget, so
+the server's disk footprint stays bounded however long it runs.
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_MAX_AGE_SECONDS = 6 * 3600
+ARTIFACT_DIR_NAME = "takealot_artifacts"
+
+
+class ArtifactStore:
+    """Hands out file paths per session and deletes them when they are no longer needed."""
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.root = root or os.path.join(tempfile.gettempdir(), ARTIFACT_DIR_NAME)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(self.root, exist_ok=True)
+        # path -> {"owner", "created", "active"}; active files are still being written
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+
+    def new_path(self, owner, prefix="artifact", suffix=""):
+        """Reserve a unique path for `owner`; it is protected from eviction until `finish()`."""
+        self.evict()
+        name = f"{prefix}_{_timestamp()}_{uuid.uuid4().hex[:8]}{suffix}"
+        path = os.path.join(self.root, name)
+        with self._lock:
+            self._entries[path] = {"owner": owner, "created": time.time(), "active": True}
+        return path
+
+    def finish(self, path):
+        """Mark a file as complete; from now on it counts towards eviction."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                entry["active"] = False
+        self.evict()
+
+    def exists(self, path):
+        with self._lock:
+            return path in self._entries and os.path.exists(path)
+
+    def release(self, path):
+        """Delete one file and forget it."""
+        with self._lock:
+            self._entries.pop(path, None)
+        _remove(path)
+
+    def release_owner(self, owner):
+        """Delete every file belonging to `owner` (e.g. when a session ends)."""
+        with self._lock:
+            paths = [path for path, entry in self._entries.items() if entry["owner"] == owner]
+            for path in paths:
+                del self._entries[path]
+        for path in paths:
+            _remove(path)
+        return len(paths)
+
+    def evict(self):
+        """Drop finished files older than `max_age_seconds`, then oldest first until under `max_bytes`."""
+        now = time.time()
+        victims = []
+        with self._lock:
+            finished = sorted(((entry["created"], path) for path, entry in self._entries.items()
+                               if not entry["active"]))
+            total = sum(_size(path) for path in self._entries)
+            for created, path in finished:
+                expired = self.max_age_seconds and now - created > self.max_age_seconds
+                if not expired and total <= self.max_bytes:
+                    continue
+                size = _size(path)
+                total -= size
+                del self._entries[path]
+                victims.append((path, size))
+        for path, size in victims:
+            _remove(path)
+            self.evicted_files += 1
+            self.evicted_bytes += size
+        return len(victims)
+
+    def sweep_orphans(self):
+        """Remove files in the store directory left behind by an earlier process."""
+        cutoff = time.time() - (self.max_age_seconds or 0)
+        with self._lock:
+            known = set(self._entries)
+        removed = 0
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.path not in known and entry.stat().st_mtime < cutoff:
+                _remove(entry.path)
+                removed += 1
+        return removed
+
+    def stats(self):
+        with self._lock:
+            paths = list(self._entries)
+            active = sum(entry["active"] for entry in self._entries.values())
+        return {
+            "files": len(paths),
+            "active_files": active,
+            "bytes_on_disk": sum(_size(path) for path in paths),
+            "max_bytes": self.max_bytes,
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+
+def _timestamp():
+    return time.strftime("%Y%m%d_%H%M%S")
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,132 @@
+"""
+SHAP and what-if chart rendering for the dashboard.
+
+matplotlib and seaborn are only imported when the first chart is drawn (or
+during background warm-up). Charts are drawn on standalone Figure objects,
+not pyplot state, so they can be rendered from worker threads.
+"""
+import base64
+import threading
+from io import BytesIO
+
+import numpy as np
+
+# matplotlib/seaborn are only needed for the SHAP chart, so they are imported on
+# first use (or during background warm-up) rather than at startup
+_pyplot = None
+_pyplot_lock = threading.Lock()
+
+def get_pyplot():
+    global _pyplot
+    with _pyplot_lock:
+        if _pyplot is None:
+            import matplotlib.pyplot as plt
+            import seaborn as sns
+            
+            # Set style for better plots
+            plt.style.use('seaborn-v0_8')
+            sns.set_palette("viridis")
+            _pyplot = plt
+        return _pyplot
+
+def render_png(draw):
+    """Draw onto a fresh 10x6 figure and return it as a PNG data URI."""
+    get_pyplot()  # applies the shared plot style
+    # Figure objects (not pyplot) so rendering is safe outside the main thread
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    fig.patch.set_facecolor('none')
+    ax.set_facecolor('none')
+    draw(ax)
+    fig.tight_layout()
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", dpi=150, bbox_inches='tight',
+                facecolor='none', edgecolor='none', transparent=True)
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def draw_shap_placeholder(ax):
+    # Create placeholder text with simpler styling
+    ax.text(0.5, 0.5, 'Click "Analyze Customer" to see\nfeature importance analysis', 
+           horizontalalignment='center', verticalalignment='center',
+           transform=ax.transAxes, fontsize=16, color='white', 
+           bbox=dict(boxstyle="round,pad=0.5", facecolor='gray', 
+                    edgecolor='white', alpha=0.3))
+    
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    ax.axis('off')
+    
+    # Remove all spines and ticks
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    ax.set_xticks([])
+    ax.set_yticks([])
+
+def draw_shap_bars(ax, feature_names, shap_vals):
+    colors = ['#ff6b6b' if x < 0 else '#4ade80' for x in shap_vals]
+    
+    y_pos = np.arange(len(feature_names))
+    bars = ax.barh(y_pos, shap_vals, color=colors, alpha=0.8)
+    
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels([name.replace('_', ' ') for name in feature_names], color='white', fontsize=10)
+    ax.set_xlabel('SHAP Value (Impact on Purchase Intent)', color='white', fontsize=12)
+    ax.set_title('AI Feature Importance Analysis', fontsize=14, fontweight='bold', color='white')
+    ax.axvline(x=0, color='white', linestyle='-', alpha=0.3)
+    
+    # Style the plot for glassmorphic theme
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.spines['bottom'].set_color('white')
+    ax.spines['left'].set_color('white')
+    ax.tick_params(colors='white')
+    ax.grid(True, alpha=0.3, color='white')
+    
+    # Add value labels on bars
+    for i, (bar, val) in enumerate(zip(bars, shap_vals)):
+        ax.text(val + (0.01 if val >= 0 else -0.01), i, f'{val:.3f}', 
+               va='center', ha='left' if val >= 0 else 'right', 
+               fontweight='bold', color='white', fontsize=9)
+
+def _style_axes(ax):
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.spines['bottom'].set_color('white')
+    ax.spines['left'].set_color('white')
+    ax.tick_params(colors='white')
+
+def draw_sensitivity_curve(ax, sweep, label, threshold):
+    # Purchase probability as one feature moves, with the current value marked
+    x = sweep['axes'][0]
+    ax.plot(x, sweep['probability'], color='#4ade80', linewidth=2.5)
+    ax.fill_between(x, sweep['probability'], threshold, where=sweep['probability'] > threshold,
+                    color='#4ade80', alpha=0.15)
+    ax.axhline(y=threshold, color='#ff6b6b', linestyle='--', alpha=0.8, label=f'Threshold ({threshold:.2f})')
+    ax.scatter(sweep['base_values'], [sweep['base_probability']], color='white', s=80, zorder=3,
+               label=f"Current ({sweep['base_probability']:.1%})")
+    
+    ax.set_ylim(0, 1)
+    ax.set_xlabel(label, color='white', fontsize=12)
+    ax.set_ylabel('Purchase Probability', color='white', fontsize=12)
+    ax.set_title(f'What-if: {label}', fontsize=14, fontweight='bold', color='white')
+    ax.legend(facecolor='none', labelcolor='white', edgecolor='white')
+    _style_axes(ax)
+    ax.grid(True, alpha=0.3, color='white')
+
+def draw_sensitivity_heatmap(ax, sweep, labels, threshold):
+    # Purchase probability over two features; the contour is the decision boundary
+    x, y = sweep['axes']
+    probability = sweep['probability'].T  # rows follow the second feature
+    mesh = ax.pcolormesh(x, y, probability, cmap='viridis', vmin=0, vmax=1, shading='auto')
+    if probability.min() < threshold < probability.max():
+        ax.contour(x, y, probability, levels=[threshold], colors='#ff6b6b', linewidths=2)
+    ax.scatter(*sweep['base_values'], color='white', edgecolor='black', s=90, zorder=3)
+    colorbar = ax.figure.colorbar(mesh, ax=ax)
+    colorbar.set_label('Purchase Probability', color='white')
+    colorbar.ax.tick_params(colors='white')
+    
+    ax.set_xlabel(labels[0], color='white', fontsize=12)
+    ax.set_ylabel(labels[1], color='white', fontsize=12)
+    ax.set_title(f'What-if: {labels[0]} x {labels[1]}', fontsize=14, fontweight='bold', color='white')
+    _style_axes(ax)
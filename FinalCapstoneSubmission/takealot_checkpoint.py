@@ -0,0 +1,151 @@
+"""
+Content-addressed checkpoints of scored batch partitions.
+
+Every partition a batch job finishes is saved as a headerless CSV fragment
+plus its summary totals, keyed by a fingerprint of the partition's row
+positions and feature values, the rows it explains and the scoring configuration (model files,
+threshold, driver count). A job that failed or was cancelled part-way picks
+up after its last finished partition when it is run again, and a rerun on an
+edited file only re-scores partitions whose rows changed - the rest are
+copied from disk. Reused rows keep the Timestamp of the run that scored them.
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import uuid
+
+import numpy as np
+
+from takealot_featurecache import content_key
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+CHECKPOINT_DIR_NAME = "takealot_checkpoints"
+# Bumped whenever the fragment layout or the result columns change
+CHECKPOINT_FORMAT = 2
+
+
+def model_files_key(*paths):
+    """Fingerprint of model files by content."""
+    return hashlib.blake2b("|".join(content_key(path) for path in paths).encode(),
+                           digest_size=16).hexdigest()
+
+
+def model_objects_key(*models):
+    """Fingerprint of in-memory models (used when their files are unknown)."""
+    return hashlib.blake2b(pickle.dumps(models, protocol=4), digest_size=16).hexdigest()
+
+
+def scoring_config_key(model_key, threshold, top_k):
+    """Fingerprint of everything besides the rows that decides a partition's output."""
+    config = {"format": CHECKPOINT_FORMAT, "model": model_key,
+              "threshold": float(threshold), "top_k": int(top_k)}
+    return hashlib.blake2b(json.dumps(config, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def partition_fingerprint(config_key, chunk, explain_mask=None):
+    """
+    Fingerprint of one partition: its row positions, column names, dtypes and
+    values plus the explain mask.
+
+    Positions are part of it because they are written to the `row` column, so
+    a saved fragment is only reused for the same rows at the same place.
+    """
+    digest = hashlib.blake2b(config_key.encode(), digest_size=16)
+    digest.update(b"rows;")
+    digest.update(np.ascontiguousarray(chunk.index.to_numpy(dtype=np.int64)))
+    for col, values in chunk.items():
+        values = np.ascontiguousarray(values.to_numpy())
+        digest.update(f"{col}:{values.dtype.str}:{len(values)};".encode())
+        digest.update(values)
+    if explain_mask is not None:
+        digest.update(b"explain;")
+        digest.update(np.ascontiguousarray(explain_mask, dtype=bool))
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    """On-disk store of scored partitions, bounded by total bytes (least recently used go first)."""
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root or os.path.join(tempfile.gettempdir(), CHECKPOINT_DIR_NAME)
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _paths(self, fingerprint):
+        base = os.path.join(self.root, fingerprint)
+        return base + ".csv", base + ".json"
+
+    def load(self, fingerprint):
+        """(CSV fragment bytes, totals dict) of a saved partition, or None."""
+        csv_path, meta_path = self._paths(fingerprint)
+        try:
+            # The totals are written last, so their presence marks a complete entry
+            with open(meta_path) as f:
+                totals = json.load(f)
+            with open(csv_path, "rb") as f:
+                fragment = f.read()
+            os.utime(meta_path)  # marks it recently used for eviction
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return fragment, totals
+
+    def save(self, fingerprint, fragment, totals):
+        """Store a partition's CSV fragment (bytes) and totals; replaces any previous entry."""
+        csv_path, meta_path = self._paths(fingerprint)
+        staging = f"{csv_path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(staging, "wb") as f:
+                f.write(fragment)
+            os.replace(staging, csv_path)
+            with open(staging, "w") as f:
+                json.dump(totals, f)
+            os.replace(staging, meta_path)
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+
+    def _entries(self):
+        entries = {}
+        for entry in os.scandir(self.root):
+            name, ext = os.path.splitext(entry.name)
+            if ext in (".csv", ".json") and entry.is_file():
+                stat = entry.stat()
+                mtime, size = entries.get(name, (0.0, 0))
+                entries[name] = (max(mtime, stat.st_mtime), size + stat.st_size)
+        return entries
+
+    def evict(self):
+        """Remove least recently used partitions until the store fits in `max_bytes`."""
+        entries = self._entries()
+        total = sum(size for _, size in entries.values())
+        for name, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            csv_path, meta_path = self._paths(name)
+            for path in (meta_path, csv_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+    def stats(self):
+        entries = self._entries()
+        return {"partitions": len(entries),
+                "bytes_on_disk": sum(size for _, size in entries.values()),
+                "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,187 @@
+"""
+Headless batch scoring for scheduled jobs.
+
+    python takealot_cli.py sessions.csv scored.parquet --workers 8
+
+Runs the dashboard's KMeans + XGBoost batch scoring (same feature schema,
+same model files, same result columns) without a browser or Shiny server.
+Only the scoring modules are imported, so neither Shiny nor the plotting
+libraries are loaded. `score_file` is the equivalent Python API.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from takealot_export import EXPORT_FORMATS, export_csv_file
+from takealot_ingest import check_columns, is_raw_export, read_header
+from takealot_scoring import (DEFAULT_CHUNK_SIZE, DEFAULT_DECISION_THRESHOLD, DEFAULT_TOP_K_DRIVERS,
+                              KMEANS_MODEL_PATH, XGB_MODEL_PATH, parallel_score_csv, stream_score_csv)
+
+# Model paths in takealot_scoring are relative to the app directory
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_KMEANS_PATH = os.path.join(APP_DIR, KMEANS_MODEL_PATH)
+DEFAULT_XGB_PATH = os.path.join(APP_DIR, XGB_MODEL_PATH)
+
+# Progress is reported at most this often on stderr
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+
+def format_for_path(path):
+    """Export format implied by an output filename (CSV unless it ends in .csv.gz / .parquet)."""
+    for fmt in ("csv.gz", "parquet"):
+        if path.lower().endswith(EXPORT_FORMATS[fmt][1]):
+            return fmt
+    return "csv"
+
+
+def score_file(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, fmt=None,
+               sample_size=0, threshold=DEFAULT_DECISION_THRESHOLD, explain_rows=0,
+               top_k=DEFAULT_TOP_K_DRIVERS, kmeans_path=DEFAULT_KMEANS_PATH,
+               xgb_path=DEFAULT_XGB_PATH, feature_cache=None, checkpoints=None, progress=None):
+    """
+    Score a CSV (cleaned features or a raw session export) and write the results.
+
+    `fmt` is "csv", "csv.gz" or "parquet" (default: from the output
+    extension). `workers` > 1 partitions the file across processes.
+    Results are written to a temporary file next to `output_path` and moved
+    into place at the end, so a failed run never leaves a truncated output.
+    Returns the same summary dict as `stream_score_csv`.
+    """
+    fmt = fmt or format_for_path(output_path)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown output format: {fmt}")
+    # Fail on a missing file or unusable columns before any model is loaded
+    header = read_header(input_path)
+    if not is_raw_export(header):
+        check_columns(header)
+    options = dict(chunk_size=chunk_size, sample_size=sample_size, progress=progress,
+                   threshold=threshold, explain_rows=explain_rows, top_k=top_k,
+                   feature_cache=feature_cache, checkpoints=checkpoints)
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    fd, scored_path = tempfile.mkstemp(prefix=".takealot_scored_", suffix=".csv", dir=output_dir)
+    os.close(fd)
+    final_path = scored_path
+    try:
+        if workers > 1:
+            summary = parallel_score_csv(input_path, scored_path, workers=workers,
+                                         kmeans_path=kmeans_path, xgb_path=xgb_path, **options)
+        else:
+            import joblib
+            from takealot_checkpoint import model_files_key
+            explainer = None
+            xgb_model = joblib.load(xgb_path)
+            if explain_rows > 0:
+                import shap
+                explainer = shap.TreeExplainer(xgb_model)
+            summary = stream_score_csv(input_path, scored_path, joblib.load(kmeans_path), xgb_model,
+                                       explainer=explainer,
+                                       model_key=model_files_key(kmeans_path, xgb_path), **options)
+
+        if fmt != "csv":
+            # Converted chunk by chunk from the scored CSV
+            fd, final_path = tempfile.mkstemp(prefix=".takealot_export_", dir=output_dir)
+            with os.fdopen(fd, "wb") as f:
+                for block in export_csv_file(scored_path, fmt, chunk_rows=chunk_size):
+                    f.write(block)
+        os.replace(final_path, output_path)
+    finally:
+        for path in {scored_path, final_path}:
+            if os.path.exists(path):
+                os.remove(path)
+
+    summary["output_path"] = output_path
+    summary["format"] = fmt
+    return summary
+
+
+def _progress_printer(stream):
+    last = [0.0]
+
+    def progress(rows_done, total_rows):
+        now = time.monotonic()
+        if now - last[0] >= PROGRESS_INTERVAL_SECONDS or rows_done >= total_rows:
+            last[0] = now
+            percent = 100.0 * rows_done / total_rows if total_rows else 100.0
+            print(f"scored {rows_done:,} / {total_rows:,} rows ({percent:.0f}%)", file=stream, flush=True)
+    return progress
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="takealot_cli.py",
+        description="Score a CSV of shopper sessions with the Takealot KMeans and XGBoost models.")
+    parser.add_argument("input", help="CSV of cleaned features or a raw online_shoppers_intention export")
+    parser.add_argument("output", help="results file (.csv, .csv.gz or .parquet)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), dest="fmt",
+                        help="output format (default: from the output extension)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"rows per partition (default: {DEFAULT_CHUNK_SIZE:,})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes; 0 = one per CPU (default: 1)")
+    parser.add_argument("--sample-size", type=int, default=0,
+                        help="score a reproducible random sample of this many rows (default: all)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_DECISION_THRESHOLD,
+                        help="purchase probability cut-off for 'Likely' (default: %(default)s)")
+    parser.add_argument("--explain-rows", type=int, default=0,
+                        help="add top SHAP drivers for this many randomly chosen rows")
+    parser.add_argument("--kmeans-model", default=DEFAULT_KMEANS_PATH, help="KMeans model file")
+    parser.add_argument("--xgb-model", default=DEFAULT_XGB_PATH, help="XGBoost model file")
+    parser.add_argument("--cache-dir",
+                        help="keep parsed features and scored partitions here, so reruns on the same "
+                             "or a partly changed file only score what changed")
+    parser.add_argument("--quiet", action="store_true", help="no progress or summary output")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.chunk_size <= 0:
+        print("error: --chunk-size must be positive", file=sys.stderr)
+        return 2
+    if args.workers < 0:
+        print("error: --workers must be 0 (one per CPU) or more", file=sys.stderr)
+        return 2
+
+    feature_cache = checkpoints = None
+    if args.cache_dir:
+        from takealot_checkpoint import CheckpointStore
+        from takealot_featurecache import FeatureCache
+        feature_cache = FeatureCache(root=os.path.join(args.cache_dir, "features"))
+        checkpoints = CheckpointStore(root=os.path.join(args.cache_dir, "checkpoints"))
+
+    start = time.perf_counter()
+    try:
+        summary = score_file(args.input, args.output, chunk_size=args.chunk_size,
+                             workers=args.workers or os.cpu_count() or 1, fmt=args.fmt,
+                             sample_size=args.sample_size, threshold=args.threshold,
+                             explain_rows=args.explain_rows, kmeans_path=args.kmeans_model,
+                             xgb_path=args.xgb_model, feature_cache=feature_cache,
+                             checkpoints=checkpoints,
+                             progress=None if args.quiet else _progress_printer(sys.stderr))
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.workers != 1:
+            from takealot_scoring import shutdown_scoring_pool
+            shutdown_scoring_pool()
+
+    if not args.quiet:
+        total_rows = summary["total_rows"] or 1
+        print(f"wrote {summary['total_rows']:,} rows to {args.output} ({summary['format']}) "
+              f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        print(f"  high-intent: {summary['high_intent_count']:,} "
+              f"({summary['high_intent_count'] / total_rows:.1%})", file=sys.stderr)
+        print(f"  likely purchase: {summary['likely_purchase_count']:,} "
+              f"({summary['likely_purchase_count'] / total_rows:.1%})", file=sys.stderr)
+        print(f"  average purchase probability: {summary['avg_purchase_prob']:.1%}", file=sys.stderr)
+        if summary["reused_rows"]:
+            print(f"  reused from checkpoints: {summary['reused_rows']:,} rows", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
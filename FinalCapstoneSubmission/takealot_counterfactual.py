@@ -0,0 +1,215 @@
+"""
+Counterfactual search: small changes to a customer's controllable features
+that make the XGBoost model predict "Likely".
+
+A tree ensemble is piecewise constant, so a prediction can only change where
+a feature crosses one of the model's split thresholds. Each controllable
+feature is therefore only tried just past the thresholds around its current
+value; for a duration these include the thresholds of the page count and
+Total_Duration derived from it. Combinations of up to `max_changed` features
+are built as arrays, ordered by the size of the change and scored cheapest
+first in `predict_proba` batches. Each batch is sized from the measured cost
+of a call (a fixed overhead plus a cost per row) so that it fits the time
+budget left. The search stops once enough
+flips are found, otherwise it widens the combinations to more values per
+feature, round by round, until the candidates run out or the budget is spent.
+Results are the cheapest flips found within that budget, not a proven
+minimum: a later round can still hold a cheaper combination than one found
+in an earlier round.
+
+Change size is the L1 distance with every feature scaled by its dashboard
+input range, so moving PageValues by 50 costs as much as moving the product
+browsing duration by 720 seconds.
+"""
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+from takealot_scoring import DEFAULT_DECISION_THRESHOLD
+from takealot_whatif import PAGE_SECONDS, SWEEP_FEATURES, derive_page_features
+
+# Features marketing can influence; everything else is held at the customer's values
+CONTROLLABLE_FEATURES = ["PageValues", "ExitRates", "ProductRelated_Duration",
+                         "Administrative_Duration", "Informational_Duration"]
+
+DEFAULT_TIME_BUDGET_SECONDS = 1.0
+DEFAULT_MAX_RESULTS = 3
+DEFAULT_MAX_CHANGED = 3
+# Nearest candidate values per feature when it is combined with others, doubled
+# every widening round (single-feature changes try every threshold in range)
+COMBINATION_CANDIDATES = {2: 24, 3: 8}
+# Widening stops once a feature combination would exceed this many rows
+MAX_COMBINATION_ROWS = 32_768
+# Rows per predict_proba batch: the first one measures the cost per row (the
+# one-row base score gives the per-call overhead), later ones are sized to the
+# remaining budget up to BATCH_ROWS. The budget counts as spent once fewer than
+# MIN_BATCH_ROWS would fit.
+FIRST_BATCH_ROWS = 256
+MIN_BATCH_ROWS = 32
+BATCH_ROWS = 4096
+# Share of the remaining budget a batch is sized to fill, leaving room for the bookkeeping
+BATCH_BUDGET_SHARE = 0.8
+
+
+def candidate_values(ensemble, base, feature):
+    """Values of `feature` just across each relevant split threshold, nearest first."""
+    columns = base.columns
+    value = float(base[feature].iloc[0])
+    breaks = [ensemble.split_thresholds(columns.get_loc(feature))]
+    if feature.endswith("_Duration"):
+        pages = feature[:-len("_Duration")]
+        # Page count is max(1, duration // seconds), so a cut t > 1 moves at ceil(t) pages
+        page_cuts = ensemble.split_thresholds(columns.get_loc(pages))
+        breaks.append(np.ceil(page_cuts[page_cuts > 1]) * PAGE_SECONDS[pages])
+        other_durations = sum(float(base[f"{name}_Duration"].iloc[0]) for name in PAGE_SECONDS) - value
+        breaks.append(ensemble.split_thresholds(columns.get_loc("Total_Duration")) - other_durations)
+    breaks = np.unique(np.concatenate(breaks).astype(np.float64))
+
+    # XGBoost sends x < cut left: step just over cuts above, just under cuts at or below
+    margin = 1e-6 * np.maximum(1.0, np.abs(breaks))
+    values = np.where(breaks > value, breaks + margin, breaks - margin)
+    _, lo, hi = SWEEP_FEATURES[feature]
+    values = np.unique(values[(values >= lo) & (values <= hi) & (values != value)])
+    return values[np.argsort(np.abs(values - value), kind="stable")]
+
+
+def _combination_width(size, round_):
+    """Candidate values per feature for `size`-feature changes (None = all) in a widening round."""
+    if size == 1:
+        return None if round_ == 0 else 0
+    width = COMBINATION_CANDIDATES.get(size, min(COMBINATION_CANDIDATES.values())) << round_
+    return min(width, int(round(MAX_COMBINATION_ROWS ** (1 / size))))
+
+
+def _candidate_grid(candidates, base_values, scale, max_changed, round_=0):
+    """
+    (values, costs) of the combinations new in widening `round_`, cheapest first.
+
+    Rows span the controllable features; an empty result means nothing is
+    left to widen.
+    """
+    blocks = []
+    for size in range(1, max_changed + 1):
+        width = _combination_width(size, round_)
+        previous = _combination_width(size, round_ - 1) if round_ > 0 else 0
+        for combo in itertools.combinations(range(len(candidates)), size):
+            axes = [candidates[i][:width] for i in combo]
+            if any(len(axis) == 0 for axis in axes):
+                continue
+            positions = [grid.ravel() for grid in np.meshgrid(*[np.arange(len(axis)) for axis in axes],
+                                                               indexing="ij")]
+            # Combinations scored in earlier rounds only use positions below `previous`
+            new = np.any([pos >= previous for pos in positions], axis=0) if previous else None
+            block = np.repeat(base_values[None, :], len(positions[0]) if new is None else new.sum(), axis=0)
+            for i, axis, pos in zip(combo, axes, positions):
+                block[:, i] = axis[pos if new is None else pos[new]]
+            blocks.append(block)
+    if not blocks:
+        return np.empty((0, len(base_values))), np.empty(0)
+    values = np.concatenate(blocks)
+    costs = (np.abs(values - base_values) / scale).sum(axis=1)
+    order = np.argsort(costs, kind="stable")
+    return values[order], costs[order]
+
+
+def _score_rows(xgb_model, base, features, values):
+    rows = pd.DataFrame(np.repeat(base.to_numpy(dtype=np.float64), len(values), axis=0),
+                        columns=base.columns)
+    for i, name in enumerate(features):
+        rows[name] = values[:, i]
+    derive_page_features(rows)
+    return xgb_model.predict_proba(rows)[:, 1]
+
+
+def find_counterfactuals(xgb_model, ensemble, base, threshold=DEFAULT_DECISION_THRESHOLD,
+                         features=CONTROLLABLE_FEATURES, max_results=DEFAULT_MAX_RESULTS,
+                         max_changed=DEFAULT_MAX_CHANGED, time_budget=DEFAULT_TIME_BUDGET_SECONDS):
+    """
+    Changes to `base` (one row, XGBoost feature order) predicted "Likely",
+    found within `time_budget` seconds.
+
+    `ensemble` is the model's FlatTreeEnsemble, used for its split thresholds.
+    Results are cheapest first and none is just a larger version of another
+    (same features moved the same way, at least as far). Returns a dict with
+    base_probability, counterfactuals (each with changes as
+    [(feature, old, new), ...], probability and cost), rows_scored, seconds,
+    and complete - False if the time budget ran out before the search did.
+    """
+    start = time.perf_counter()
+    features = list(features)
+    base_values = base[features].iloc[0].to_numpy(dtype=np.float64)
+    scale = np.array([SWEEP_FEATURES[name][2] - SWEEP_FEATURES[name][1] for name in features])
+    base_probability = float(_score_rows(xgb_model, base, features, base_values[None, :])[0])
+    call_seconds = time.perf_counter() - start
+
+    result = {"base_probability": base_probability, "counterfactuals": [], "rows_scored": 1,
+              "complete": True}
+    if base_probability > threshold:
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    candidates = [candidate_values(ensemble, base, name) for name in features]
+    found = []
+    score_seconds, rows_timed, calls = 0.0, 0, 0
+    for round_ in itertools.count():
+        if time.perf_counter() - start > time_budget:
+            result["complete"] = False
+            break
+        values, costs = _candidate_grid(candidates, base_values, scale, max_changed, round_)
+        if len(values) == 0:
+            break
+        batch_start = 0
+        while batch_start < len(values):
+            remaining = time_budget - (time.perf_counter() - start)
+            rows = FIRST_BATCH_ROWS
+            if rows_timed:
+                row_seconds = max(score_seconds - calls * call_seconds, 0.0) / rows_timed or 1e-9
+                rows = min(BATCH_ROWS, int((BATCH_BUDGET_SHARE * remaining - call_seconds) / row_seconds))
+            if remaining <= 0 or rows < MIN_BATCH_ROWS:
+                result["complete"] = False
+                break
+            batch = values[batch_start:batch_start + rows]
+            batch_clock = time.perf_counter()
+            probabilities = _score_rows(xgb_model, base, features, batch)
+            score_seconds += time.perf_counter() - batch_clock
+            rows_timed += len(batch)
+            calls += 1
+            result["rows_scored"] += len(batch)
+
+            flips = np.flatnonzero(probabilities > threshold)
+            deltas = batch[flips] - base_values
+            open_flips = np.ones(len(flips), dtype=bool)
+            for accepted in found:
+                open_flips &= ~_dominated_by(deltas, accepted["delta"])
+            # Rows are in cost order, so the first open flip is the cheapest left in this round
+            while open_flips.any() and len(found) < max_results:
+                k = int(np.argmax(open_flips))
+                found.append({"delta": deltas[k], "row": batch[flips[k]],
+                              "probability": float(probabilities[flips[k]]),
+                              "cost": float(costs[batch_start + flips[k]])})
+                open_flips &= ~_dominated_by(deltas, deltas[k])
+            if len(found) >= max_results:
+                break
+            batch_start += len(batch)
+        if len(found) >= max_results or not result["complete"]:
+            break
+
+    found.sort(key=lambda cf: cf["cost"])
+    result["counterfactuals"] = [
+        {"changes": [(name, float(old), float(new))
+                     for name, old, new, delta in zip(features, base_values, cf["row"], cf["delta"])
+                     if delta != 0],
+         "probability": cf["probability"], "cost": cf["cost"]}
+        for cf in found]
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _dominated_by(deltas, delta):
+    """Rows of `deltas` that move every feature `delta` moves, the same way and at least as far."""
+    moved = delta != 0
+    same_way = np.sign(deltas[:, moved]) == np.sign(delta[moved])
+    as_far = np.abs(deltas[:, moved]) >= np.abs(delta[moved])
+    return (same_way & as_far).all(axis=1)
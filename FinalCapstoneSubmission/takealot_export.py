@@ -0,0 +1,149 @@
+"""
+Streaming exports for the download handlers.
+
+Every exporter is a generator of str/bytes blocks, so a download never holds
+more than one block (CSV, gzip) or one row group (Parquet) in memory however
+large the result is. Parquet needs the optional pyarrow package.
+"""
+import importlib.util
+import zlib
+
+import pandas as pd
+
+from takealot_scoring import result_dtypes
+
+# Rows per CSV block / Parquet row group
+EXPORT_CHUNK_ROWS = 50_000
+# Bytes per block when streaming a file that is already CSV on disk
+EXPORT_BLOCK_BYTES = 1 << 20
+
+# format -> (label, filename extension, media type)
+EXPORT_FORMATS = {
+    "csv": ("CSV", ".csv", "text/csv"),
+    "csv.gz": ("CSV (gzip)", ".csv.gz", "application/gzip"),
+    "parquet": ("Parquet", ".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def available_formats():
+    """{format: label} for the formats this environment can produce."""
+    return {fmt: label for fmt, (label, _, _) in EXPORT_FORMATS.items()
+            if fmt != "parquet" or parquet_available()}
+
+
+def export_filename(stem, fmt):
+    return stem + EXPORT_FORMATS[fmt][1]
+
+
+def iter_file_blocks(path, block_size=EXPORT_BLOCK_BYTES):
+    """Raw bytes of a file, one block at a time."""
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
+
+
+def iter_frame_csv(df, chunk_rows=EXPORT_CHUNK_ROWS, **to_csv_kwargs):
+    """CSV text of a DataFrame in row chunks; the header is written once."""
+    yield df.iloc[:0].to_csv(index=False, **to_csv_kwargs)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=False, **to_csv_kwargs)
+
+
+def gzip_blocks(blocks, level=6):
+    """Compress a stream of str/bytes blocks into one gzip stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for block in blocks:
+        if isinstance(block, str):
+            block = block.encode("utf-8")
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _StreamSink:
+    """Write-only file object that hands bytes to the caller instead of keeping them."""
+
+    def __init__(self):
+        self.closed = False
+        self._pending = []
+        self._position = 0
+
+    def write(self, data):
+        self._pending.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._pending)
+        self._pending = []
+        return data
+
+
+def parquet_blocks(frames):
+    """Parquet bytes for a stream of DataFrames, one row group per frame."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _StreamSink()
+    writer = None
+    try:
+        for frame in frames:
+            if writer is None:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), table.schema,
+                                          compression="snappy")
+            else:
+                # Later chunks are cast to the first chunk's schema (e.g. int -> float)
+                table = pa.Table.from_pandas(frame, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.drain()
+
+
+def export_csv_file(path, fmt, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Stream a batch results CSV on disk in `fmt`, converting chunk by chunk.
+
+    Parquet chunks are parsed with the declared result dtypes, so every row
+    group matches the schema the first one fixed.
+    """
+    if fmt == "csv":
+        return iter_file_blocks(path)
+    if fmt == "csv.gz":
+        return gzip_blocks(iter_file_blocks(path))
+    if fmt == "parquet":
+        dtype = result_dtypes(pd.read_csv(path, nrows=0).columns)
+        return parquet_blocks(pd.read_csv(path, chunksize=chunk_rows, dtype=dtype))
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def export_frame(df, fmt, chunk_rows=EXPORT_CHUNK_ROWS, **to_csv_kwargs):
+    """Stream an in-memory DataFrame in `fmt`."""
+    if fmt == "csv":
+        return iter_frame_csv(df, chunk_rows, **to_csv_kwargs)
+    if fmt == "csv.gz":
+        return gzip_blocks(iter_frame_csv(df, chunk_rows, **to_csv_kwargs))
+    if fmt == "parquet":
+        chunks = (df.iloc[start:start + chunk_rows] for start in range(0, max(len(df), 1), chunk_rows))
+        return parquet_blocks(chunks)
+    raise ValueError(f"Unknown export format: {fmt}")
@@ -0,0 +1,161 @@
+"""
+Low-latency single-row scoring for the "Analyze Customer" path.
+
+The XGBoost booster is flattened into NumPy node tables (feature, threshold,
+left, right, default-left, leaf value) and traversed for all trees at once,
+one tree level per step. Scoring a plain float vector this way skips the
+DataFrame validation and DMatrix construction that dominate a 1-row
+`predict_proba` call.
+"""
+import json
+import time
+
+import numpy as np
+
+# Largest acceptable |fast - reference| purchase probability
+VALIDATION_TOLERANCE = 1e-5
+
+
+class FlatTreeEnsemble:
+    """Array-backed copy of a binary:logistic XGBoost ensemble."""
+
+    def __init__(self, xgb_model):
+        booster = xgb_model.get_booster()
+        config = json.loads(booster.save_raw("json"))
+        learner = config["learner"]
+        objective = learner["objective"]["name"]
+        if objective != "binary:logistic":
+            raise ValueError(f"Unsupported objective for fast path: {objective}")
+
+        trees = learner["gradient_booster"]["model"]["trees"]
+        # Respect early stopping exactly like XGBClassifier.predict_proba does
+        best_iteration = getattr(xgb_model, "best_iteration", None)
+        if best_iteration is not None:
+            trees = trees[:best_iteration + 1]
+
+        feature, threshold, left, right, default_left, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            if any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported by the fast path")
+            tree_left = np.asarray(tree["left_children"], dtype=np.int32)
+            tree_right = np.asarray(tree["right_children"], dtype=np.int32)
+            is_leaf = tree_left == -1
+            roots.append(offset)
+            # Leaves point at themselves so finished trees stay put while deeper ones advance
+            node_ids = np.arange(len(tree_left), dtype=np.int32) + offset
+            left.append(np.where(is_leaf, node_ids, tree_left + offset))
+            right.append(np.where(is_leaf, node_ids, tree_right + offset))
+            feature.append(np.where(is_leaf, 0, tree["split_indices"]).astype(np.int32))
+            # For leaves XGBoost stores the leaf value in split_conditions
+            threshold.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+            default_left.append(np.asarray(tree["default_left"], dtype=bool))
+            offset += len(tree_left)
+
+        self.feature = np.concatenate(feature)
+        self.threshold = np.concatenate(threshold)
+        self.left = np.concatenate(left)
+        self.right = np.concatenate(right)
+        self.default_left = np.concatenate(default_left)
+        self.is_leaf = self.left == np.arange(offset)
+        self.leaf_value = np.where(self.is_leaf, self.threshold, 0).astype(np.float32)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.n_trees = len(trees)
+        self.n_features = int(learner["learner_model_param"]["num_feature"])
+        self.max_depth = self._max_depth()
+
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+        self.base_margin = np.log(base_score / (1 - base_score))
+
+    def _max_depth(self):
+        # Breadth-first over all trees at once; depth = number of internal levels
+        frontier = self.roots
+        depth = 0
+        while True:
+            internal = frontier[~self.is_leaf[frontier]]
+            if len(internal) == 0:
+                return depth
+            frontier = np.concatenate([self.left[internal], self.right[internal]])
+            depth += 1
+
+    def split_thresholds(self, feature_index):
+        """Sorted distinct split thresholds used on one feature (where predictions can change)."""
+        return np.unique(self.threshold[~self.is_leaf & (self.feature == feature_index)])
+
+    def predict_proba_row(self, row):
+        """Purchase probability for one feature vector in XGBoost column order."""
+        x = np.asarray(row, dtype=np.float32)
+        nodes = self.roots
+        for _ in range(self.max_depth):
+            values = x[self.feature[nodes]]
+            go_left = np.where(np.isnan(values), self.default_left[nodes],
+                               values < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        margin = self.base_margin + self.leaf_value[nodes].sum(dtype=np.float32)
+        return float(1.0 / (1.0 + np.exp(-margin)))
+
+    def predict_proba_rows(self, rows):
+        """Vectorised variant for a small 2-D block of rows."""
+        x = np.asarray(rows, dtype=np.float32)
+        nodes = np.broadcast_to(self.roots, (len(x), self.n_trees))
+        row_index = np.arange(len(x))[:, None]
+        for _ in range(self.max_depth):
+            values = x[row_index, self.feature[nodes]]
+            go_left = np.where(np.isnan(values), self.default_left[nodes],
+                               values < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        margin = self.base_margin + self.leaf_value[nodes].sum(axis=1, dtype=np.float32)
+        return 1.0 / (1.0 + np.exp(-margin))
+
+
+def nearest_cluster(kmeans_model, row):
+    """KMeans assignment for one vector - argmin squared distance to the centroids."""
+    x = np.asarray(row, dtype=np.float64)
+    distances = ((kmeans_model.cluster_centers_ - x) ** 2).sum(axis=1)
+    return int(np.argmin(distances))
+
+
+def validation_rows(ensemble, n_rows=512, seed=42):
+    """
+    Synthetic rows that straddle the ensemble's own split thresholds.
+
+    Each feature value is drawn from that feature's thresholds nudged just
+    below or above, so every validation row exercises boundary decisions.
+    """
+    rng = np.random.default_rng(seed)
+    internal = ~ensemble.is_leaf
+    rows = np.zeros((n_rows, ensemble.n_features), dtype=np.float32)
+    for j in range(ensemble.n_features):
+        cuts = ensemble.threshold[internal & (ensemble.feature == j)]
+        if len(cuts) == 0:
+            continue
+        picked = rng.choice(cuts, size=n_rows)
+        nudge = rng.choice([-1, 1], size=n_rows) * np.maximum(np.abs(picked), 1) * 1e-3
+        rows[:, j] = picked + nudge
+    return rows
+
+
+def validate_fast_path(ensemble, xgb_model, rows, tolerance=VALIDATION_TOLERANCE):
+    """Raise ValueError unless the flat ensemble matches `xgb_model` on `rows`."""
+    expected = xgb_model.predict_proba(rows)[:, 1]
+    actual = ensemble.predict_proba_rows(np.asarray(rows, dtype=np.float32))
+    max_error = float(np.max(np.abs(expected - actual)))
+    if max_error > tolerance:
+        raise ValueError(f"Fast path deviates from reference model by {max_error:.2e}")
+    return max_error
+
+
+def latency_report(fn, rows, repeat=1000):
+    """Call `fn(row)` `repeat` times cycling through `rows`; returns p50/p99/mean in microseconds."""
+    timings = np.empty(repeat)
+    for i in range(repeat):
+        row = rows[i % len(rows)]
+        start = time.perf_counter()
+        fn(row)
+        timings[i] = time.perf_counter() - start
+    timings *= 1e6
+    return {
+        "p50_us": float(np.percentile(timings, 50)),
+        "p99_us": float(np.percentile(timings, 99)),
+        "mean_us": float(timings.mean()),
+    }
@@ -0,0 +1,267 @@
+"""
+Content-addressed, memory-mapped cache of parsed feature matrices.
+
+The first time a dataset is streamed, its compact feature chunks are also
+appended to one raw binary file per column. Later runs over a file with the
+same bytes (a re-upload, "Load Demo Dataset" again) open those files with
+`np.memmap` instead of parsing CSV text: slicing is zero-copy and every
+worker process that maps the same file shares its page-cache pages.
+
+A job reading an entry holds a lease on it (`FeatureCache.reading`), an
+empty file inside the entry, so eviction by this or any other process
+sharing the cache directory leaves it alone until the job is done.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+CACHE_DIR_NAME = "takealot_feature_cache"
+HASH_BLOCK_BYTES = 1 << 20
+META_FILE = "meta.json"
+LEASE_PREFIX = "lease-"
+# Leases older than this were left behind by a job that crashed and are ignored
+LEASE_MAX_AGE_SECONDS = 6 * 3600
+# Part of every cache key; bump it when the features parsed from the same bytes
+# change (2: raw exports are standardized like the notebook's cleaned file,
+# 3: fractional columns are kept as float64)
+CACHE_FORMAT = 3
+
+
+def content_key(path):
+    """blake2b digest of a file's bytes."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FeatureSlice:
+    """Picklable reference to rows [start, stop) of a cached dataset (optionally a subset)."""
+
+    def __init__(self, directory, meta, start, stop, positions=None):
+        self.directory = directory
+        self.meta = meta
+        self.start = start
+        self.stop = stop
+        self.positions = positions
+
+    def __len__(self):
+        return self.stop - self.start if self.positions is None else len(self.positions)
+
+    def load(self):
+        """The rows as a DataFrame backed by the memory-mapped column files."""
+        rows = self.meta["rows"]
+        columns = {}
+        for col, dtype in zip(self.meta["columns"], self.meta["dtypes"]):
+            values = np.memmap(os.path.join(self.directory, f"{col}.bin"), dtype=dtype,
+                               mode="r", shape=(rows,))[self.start:self.stop]
+            columns[col] = values if self.positions is None else values[self.positions - self.start]
+        index = (pd.RangeIndex(self.start, self.stop) if self.positions is None
+                 else pd.Index(self.positions))
+        return pd.DataFrame(columns, index=index, copy=False)
+
+
+class CachedFeatures:
+    """A dataset present in the cache."""
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.meta = meta
+
+    @property
+    def rows(self):
+        return self.meta["rows"]
+
+    def slice(self, start=0, stop=None, positions=None):
+        stop = self.rows if stop is None else min(stop, self.rows)
+        return FeatureSlice(self.directory, self.meta, start, stop, positions)
+
+    def iter_slices(self, chunk_size, keep_rows=None):
+        """FeatureSlices of at most `chunk_size` source rows, restricted to sorted `keep_rows`."""
+        for start in range(0, self.rows, chunk_size):
+            stop = min(start + chunk_size, self.rows)
+            positions = None
+            if keep_rows is not None:
+                lo, hi = np.searchsorted(keep_rows, [start, stop])
+                positions = keep_rows[lo:hi]
+                if len(positions) == 0:
+                    continue
+            yield FeatureSlice(self.directory, self.meta, start, stop, positions)
+
+
+class FeatureCache:
+    """On-disk cache of parsed feature matrices keyed by file content, bounded by total bytes."""
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root or os.path.join(tempfile.gettempdir(), CACHE_DIR_NAME)
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self._keys = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, path):
+        """Content key of `path`, memoised on (path, size, mtime) so unchanged files hash once."""
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            key = self._keys.get(signature)
+        if key is None:
+            key = f"v{CACHE_FORMAT}-{content_key(path)}"
+            with self._lock:
+                self._keys[signature] = key
+        return key
+
+    @contextmanager
+    def reading(self, path):
+        """
+        Keep the entry for `path` from being evicted while the block runs.
+
+        Take it before `lookup` and hold it until every slice has been
+        loaded. Does nothing if the file is not cached yet.
+        """
+        lease = os.path.join(self.root, self.key_for(path), f"{LEASE_PREFIX}{uuid.uuid4().hex}")
+        try:
+            open(lease, "x").close()
+        except FileNotFoundError:
+            lease = None
+        try:
+            yield
+        finally:
+            if lease is not None:
+                try:
+                    os.remove(lease)
+                except FileNotFoundError:
+                    pass
+
+    def lookup(self, path):
+        """CachedFeatures for the file's content, or None."""
+        directory = os.path.join(self.root, self.key_for(path))
+        try:
+            with open(os.path.join(directory, META_FILE)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(directory)  # marks it recently used for eviction
+        self.hits += 1
+        return CachedFeatures(directory, meta)
+
+    def store(self, path, chunks):
+        """
+        Pass `chunks` through unchanged while writing them into the cache.
+
+        The entry only becomes visible once every chunk was written with a
+        consistent schema; an interrupted or inconsistent stream is discarded.
+        """
+        key = self.key_for(path)
+        staging = os.path.join(self.root, f".{key}.{uuid.uuid4().hex[:8]}")
+        os.makedirs(staging)
+        files, meta, complete = {}, None, False
+        try:
+            for chunk in chunks:
+                if meta is None:
+                    meta = {"columns": list(chunk.columns),
+                            "dtypes": [str(dtype) for dtype in chunk.dtypes], "rows": 0}
+                    files = {col: open(os.path.join(staging, f"{col}.bin"), "wb") for col in chunk.columns}
+                if files and [str(dtype) for dtype in chunk.dtypes] != meta["dtypes"]:
+                    # Narrowed dtypes differ between chunks; skip caching this file
+                    for f in files.values():
+                        f.close()
+                    files = {}
+                if files:
+                    for col, f in files.items():
+                        f.write(np.ascontiguousarray(chunk[col].to_numpy()).tobytes())
+                    meta["rows"] += len(chunk)
+                yield chunk
+            complete = bool(files)
+        finally:
+            for f in files.values():
+                f.close()
+            if complete:
+                with open(os.path.join(staging, META_FILE), "w") as f:
+                    json.dump(meta, f)
+                try:
+                    os.rename(staging, os.path.join(self.root, key))
+                except OSError:
+                    complete = False  # another job cached the same content first
+            if not complete:
+                shutil.rmtree(staging, ignore_errors=True)
+            # Runs on early close (GeneratorExit) too, so abandoned reads still trim the cache
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in `max_bytes`, skipping leased ones."""
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and not entry.name.startswith("."):
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                entries.append((entry.stat().st_mtime, size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, directory in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if self._remove_unleased(directory):
+                total -= size
+
+    @staticmethod
+    def _leased(directory):
+        """True if a live lease is held on the entry; stale leases are deleted."""
+        leased = False
+        now = time.time()
+        for entry in os.scandir(directory):
+            if entry.name.startswith(LEASE_PREFIX):
+                try:
+                    if now - entry.stat().st_mtime <= LEASE_MAX_AGE_SECONDS:
+                        leased = True
+                    else:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        return leased
+
+    def _remove_unleased(self, directory):
+        """Delete an entry unless a job holds a lease on it; True if it was deleted."""
+        if self._leased(directory):
+            return False
+        meta_path = os.path.join(directory, META_FILE)
+        try:
+            with open(meta_path, "rb") as f:
+                meta = f.read()
+            os.remove(meta_path)  # lookups miss from here on
+        except FileNotFoundError:
+            return False  # another process is removing it
+        # A reader leases before reading the meta file, so one that already read it shows up here
+        if self._leased(directory):
+            restored = os.path.join(directory, f".{META_FILE}.{uuid.uuid4().hex[:8]}")
+            with open(restored, "wb") as f:
+                f.write(meta)
+            os.replace(restored, meta_path)
+            return False
+        shutil.rmtree(directory, ignore_errors=True)
+        return True
+
+    def stats(self):
+        bytes_on_disk = 0
+        entries = 0
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and not entry.name.startswith("."):
+                entries += 1
+                bytes_on_disk += sum(f.stat().st_size for f in os.scandir(entry.path))
+        return {"entries": entries, "bytes_on_disk": bytes_on_disk,
+                "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,275 @@
+"""
+Typed CSV ingestion for batch datasets.
+
+Only the model feature columns are parsed. They are read as float64 (the
+parsers' fastest numeric path), then integer-valued columns are narrowed to
+int8/int16/int32 when every value round-trips exactly; everything else stays
+float64, so the values written to batch results are the parsed ones. Parsing
+straight into small integer dtypes is avoided on purpose: pandas silently
+wraps values that overflow them. Other input columns are not carried into
+the results; their `row` column joins them back to the source file. The pyarrow CSV reader is used when it is installed.
+
+Raw `online_shoppers_intention.csv`-shaped exports are accepted too. The
+models were trained on the Week-4 Data_Preparation notebook's output, so each
+chunk gets that notebook's preprocessing: its encodings (month ordinals,
+VisitorType one-hot, Total_Duration, Interaction_Intensity) and then its
+StandardScaler, whose fitted mean and scale per feature are saved in
+models/feature_scaler.json. Raw exports are refused when that file is missing.
+"""
+import importlib.util
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from takealot_scoring import DEFAULT_CHUNK_SIZE, KMEANS_FEATURES, XGB_FEATURES, missing_columns
+
+# Integer-valued features and the compact dtype each is narrowed to when it fits
+INTEGER_FEATURES = {
+    "Administrative": np.int32,
+    "Informational": np.int32,
+    "ProductRelated": np.int32,
+    "Month": np.int8,
+    "OperatingSystems": np.int16,
+    "Browser": np.int16,
+    "Region": np.int16,
+    "TrafficType": np.int16,
+    "Weekend": np.int8,
+    "VisitorType_Other": np.int8,
+    "VisitorType_Returning_Visitor": np.int8,
+}
+
+# Every feature column, in XGBoost order (the KMeans features are a subset)
+FEATURE_COLUMNS = list(XGB_FEATURES)
+
+# Columns of a raw session export (the UCI online shoppers layout, minus Revenue)
+RAW_COLUMNS = ["Administrative", "Administrative_Duration", "Informational",
+               "Informational_Duration", "ProductRelated", "ProductRelated_Duration",
+               "BounceRates", "ExitRates", "PageValues", "SpecialDay", "Month",
+               "OperatingSystems", "Browser", "Region", "TrafficType", "VisitorType", "Weekend"]
+# Raw columns parsed as text and encoded by engineer_features
+RAW_TEXT_COLUMNS = ["Month", "VisitorType", "Weekend"]
+
+# Encodings from Data_Preparation.ipynb: ordinal months (note "June") and
+# VisitorType one-hot with New_Visitor as the dropped baseline
+MONTH_ORDER = ["Jan", "Feb", "Mar", "Apr", "May", "June", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+WEEKEND_TRUE_VALUES = {"true", "1", "1.0"}
+WEEKEND_FALSE_VALUES = {"false", "0", "0.0"}
+# Added to the denominator of Interaction_Intensity to avoid division by zero
+INTENSITY_EPSILON = 1e-5
+
+# The notebook's StandardScaler statistics, written by fit_feature_scaler
+FEATURE_SCALER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   "models", "feature_scaler.json")
+
+INGEST_ENGINES = ("c", "pyarrow")
+# Bytes per pyarrow read block; batches are re-sliced to the requested chunk size
+PYARROW_BLOCK_BYTES = 8 << 20
+
+
+def default_engine():
+    return "pyarrow" if importlib.util.find_spec("pyarrow") is not None else "c"
+
+
+def read_header(path):
+    """Column names of a CSV without parsing any rows."""
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def check_columns(columns):
+    """Raise ValueError unless every model feature is present."""
+    missing_xgb, missing_kmeans = missing_columns(columns)
+    if missing_xgb:
+        raise ValueError(f"Missing XGBoost columns: {missing_xgb}")
+    if missing_kmeans:
+        raise ValueError(f"Missing KMeans columns: {missing_kmeans}")
+
+
+def is_raw_export(columns):
+    """True when `columns` lack the engineered features but have every raw export column."""
+    columns = set(columns)
+    return not all(col in columns for col in FEATURE_COLUMNS) and all(col in columns for col in RAW_COLUMNS)
+
+
+def _encode_weekend(values):
+    # Factorise first so the string handling runs once per distinct value
+    codes, uniques = pd.factorize(values)
+    labels = [str(u).strip().lower() for u in uniques]
+    unknown = [str(u) for u, label in zip(uniques, labels)
+               if label not in WEEKEND_TRUE_VALUES and label not in WEEKEND_FALSE_VALUES]
+    if unknown or (codes < 0).any():
+        raise ValueError(f"Column Weekend has unrecognised values: {unknown or ['<missing>']}")
+    truth = np.array([label in WEEKEND_TRUE_VALUES for label in labels], dtype=np.float64)
+    return truth[codes]
+
+
+def encode_features(raw):
+    """Unscaled model feature columns (float64, XGBoost order) from a chunk of a raw session export."""
+    month_codes = pd.Categorical(raw["Month"], categories=MONTH_ORDER).codes
+    if (month_codes < 0).any():
+        unknown = sorted({str(v) for v in raw["Month"].to_numpy()[month_codes < 0]})
+        raise ValueError(f"Column Month has unrecognised values: {unknown}")
+
+    visitor_type = raw["VisitorType"].to_numpy()
+    features = {col: raw[col].to_numpy(dtype=np.float64)
+                for col in RAW_COLUMNS if col not in RAW_TEXT_COLUMNS}
+    features["Month"] = month_codes.astype(np.float64) + 1
+    features["Weekend"] = _encode_weekend(raw["Weekend"])
+    features["VisitorType_Other"] = (visitor_type == "Other").astype(np.float64)
+    features["VisitorType_Returning_Visitor"] = (visitor_type == "Returning_Visitor").astype(np.float64)
+    features["Total_Duration"] = (features["Administrative_Duration"] + features["Informational_Duration"]
+                                  + features["ProductRelated_Duration"])
+    features["Interaction_Intensity"] = (features["PageValues"]
+                                         / (features["ProductRelated_Duration"] + INTENSITY_EPSILON))
+    return pd.DataFrame({col: features[col] for col in FEATURE_COLUMNS}, index=raw.index)
+
+
+@lru_cache(maxsize=None)
+def load_feature_scaler(path=FEATURE_SCALER_PATH):
+    """(mean, scale) float64 arrays in XGBoost feature order, from a fit_feature_scaler file."""
+    try:
+        with open(path) as f:
+            params = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"Raw session exports need the fitted feature scaler at {path}; "
+                         "score the notebook's cleaned CSV instead") from None
+    missing = [col for col in FEATURE_COLUMNS if col not in params["columns"]]
+    if missing:
+        raise ValueError(f"Feature scaler {path} is missing columns: {missing}")
+    order = [params["columns"].index(col) for col in FEATURE_COLUMNS]
+    return (np.asarray(params["mean"], dtype=np.float64)[order],
+            np.asarray(params["scale"], dtype=np.float64)[order])
+
+
+def engineer_features(raw, scaler_path=FEATURE_SCALER_PATH):
+    """Standardized model feature columns (float64, XGBoost order) from a chunk of a raw session export."""
+    features = encode_features(raw)
+    mean, scale = load_feature_scaler(scaler_path)
+    return (features - mean) / scale
+
+
+def fit_feature_scaler(path, output_path=FEATURE_SCALER_PATH):
+    """
+    Refit the notebook's StandardScaler on a full raw export and save it to `output_path`.
+
+    Matches sklearn's StandardScaler: population standard deviation, with
+    constant columns given a scale of 1.
+    """
+    features = encode_features(pd.read_csv(path, usecols=RAW_COLUMNS,
+                                           dtype={col: str for col in RAW_TEXT_COLUMNS}))
+    mean = features.mean()
+    scale = features.std(ddof=0).replace(0.0, 1.0)
+    params = {"source": os.path.basename(path), "rows": len(features), "columns": FEATURE_COLUMNS,
+              "mean": mean.tolist(), "scale": scale.tolist()}
+    with open(output_path, "w") as f:
+        json.dump(params, f, indent=2)
+    load_feature_scaler.cache_clear()
+    return params
+
+
+def compact_features(frame):
+    """
+    Return the parsed float64 features as a new frame of compact dtypes, losslessly.
+
+    Integer-valued columns get their compact integer dtype; columns with
+    fractions or values outside its range stay float64 like the rest.
+    Missing values in KMeans features raise ValueError (KMeans cannot score them).
+    """
+    for col in KMEANS_FEATURES:
+        if col in frame.columns and frame[col].isna().any():
+            raise ValueError(f"Column {col} has missing values")
+    columns = {}
+    for col in frame.columns:
+        values = frame[col].to_numpy()
+        dtype = INTEGER_FEATURES.get(col)
+        if dtype is not None:
+            # A lossless round trip rules out NaN, fractions and overflow in one pass
+            with np.errstate(invalid="ignore"):
+                narrowed = values.astype(dtype)
+            if np.array_equal(narrowed, values):
+                columns[col] = narrowed
+                continue
+        columns[col] = values.astype(np.float64, copy=False)
+    # Built in one go; assigning column by column would copy the frame repeatedly
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def _c_chunks(path, columns, text_columns, chunk_size, nrows):
+    dtypes = {col: (str if col in text_columns else np.float64) for col in columns}
+    try:
+        reader = pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunk_size, nrows=nrows)
+        for chunk in reader:
+            yield chunk[columns]
+    except ValueError as e:
+        raise ValueError(f"Non-numeric value in a feature column: {e}") from e
+
+
+def _pyarrow_chunks(path, columns, text_columns, chunk_size, nrows):
+    import pyarrow as pa
+    from pyarrow import csv
+
+    column_types = {col: (pa.string() if col in text_columns else pa.float64()) for col in columns}
+    reader = csv.open_csv(
+        path,
+        read_options=csv.ReadOptions(block_size=PYARROW_BLOCK_BYTES),
+        convert_options=csv.ConvertOptions(include_columns=columns, column_types=column_types))
+    pending, pending_rows, remaining = [], 0, nrows
+    try:
+        for batch in reader:
+            frame = batch.to_pandas()
+            if remaining is not None:
+                frame = frame.iloc[:remaining]
+                remaining -= len(frame)
+            pending.append(frame)
+            pending_rows += len(frame)
+            while pending_rows >= chunk_size:
+                combined = pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+                yield combined.iloc[:chunk_size]
+                rest = combined.iloc[chunk_size:]
+                pending, pending_rows = ([rest], len(rest)) if len(rest) else ([], 0)
+            if remaining == 0:
+                break
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Non-numeric value in a feature column: {e}") from e
+    if pending_rows:
+        yield pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+
+
+def iter_feature_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, engine=None, nrows=None):
+    """
+    Yield the model feature columns of a CSV as compact DataFrames of at most `chunk_size` rows.
+
+    Columns are validated from the header before any row is parsed; other
+    columns in the file are never read. Raw session exports are run through
+    `engineer_features` (the notebook's encodings and scaling) first.
+    """
+    engine = engine or default_engine()
+    if engine not in INGEST_ENGINES:
+        raise ValueError(f"Unknown CSV engine: {engine}")
+    header = read_header(path)
+    raw = is_raw_export(header)
+    if raw:
+        columns, text_columns = RAW_COLUMNS, RAW_TEXT_COLUMNS
+    else:
+        check_columns(header)
+        columns, text_columns = FEATURE_COLUMNS, []
+    read_chunks = _pyarrow_chunks if engine == "pyarrow" else _c_chunks
+    rows_read = 0
+    for chunk in read_chunks(path, columns, text_columns, chunk_size, nrows):
+        if raw:
+            chunk = engineer_features(chunk)
+        chunk = compact_features(chunk)
+        chunk.index = pd.RangeIndex(rows_read, rows_read + len(chunk))
+        rows_read += len(chunk)
+        yield chunk
+
+
+def read_features(path, nrows=None, engine=None):
+    """The model feature columns of a CSV (or its first `nrows` rows) as one compact DataFrame."""
+    chunks = list(iter_feature_chunks(path, chunk_size=nrows or DEFAULT_CHUNK_SIZE,
+                                      engine=engine, nrows=nrows))
+    if not chunks:
+        return pd.DataFrame({col: pd.Series(dtype=np.float64) for col in FEATURE_COLUMNS})
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks)
@@ -0,0 +1,110 @@
+"""
+Background job runner for long-running batch analysis.
+
+Jobs run on a small thread pool so the Shiny event loop (and every other
+session's single-customer analysis) stays responsive while a large file is
+scored. Sessions poll the returned BatchJob for status and progress.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from takealot_metrics import inc, observe
+
+# Job lifecycle states
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's progress callback once cancellation is requested."""
+
+
+class BatchJob:
+    """Status handle for one submitted job, safe to read from any thread."""
+
+    def __init__(self, job_id, description=""):
+        self.job_id = job_id
+        self.description = description
+        self.status = QUEUED
+        self.rows_done = 0
+        self.total_rows = 0
+        self.result = None
+        self.error = None
+        self._cancel_event = threading.Event()
+        self._future = None
+
+    @property
+    def percent(self):
+        if self.status == FINISHED:
+            return 100.0
+        if self.total_rows <= 0:
+            return 0.0
+        return min(100.0 * self.rows_done / self.total_rows, 100.0)
+
+    @property
+    def done(self):
+        return self.status in (FINISHED, FAILED, CANCELLED)
+
+    def cancel(self):
+        """Request cancellation; queued jobs never start, running jobs stop at the next chunk."""
+        self._cancel_event.set()
+        if self._future is not None and self._future.cancel():
+            self.status = CANCELLED
+
+    def add_done_callback(self, fn):
+        """Call `fn(job)` once the job has stopped (straight away if it already has)."""
+        self._future.add_done_callback(lambda _: fn(self))
+
+    def report_progress(self, rows_done, total_rows):
+        # Passed to the job function as its `progress` callback
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.job_id} cancelled")
+        self.rows_done = rows_done
+        self.total_rows = total_rows
+
+
+class BatchJobRunner:
+    """Runs job functions on a bounded thread pool and tracks their status."""
+
+    def __init__(self, max_workers=1):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="takealot-batch")
+        self._ids = itertools.count(1)
+
+    def submit(self, fn, *args, description="", **kwargs):
+        """
+        Queue `fn(*args, progress=job.report_progress, **kwargs)` and return its BatchJob.
+
+        `fn` should call `progress(rows_done, total_rows)` regularly; that is
+        where both progress reporting and cancellation happen.
+        """
+        job = BatchJob(next(self._ids), description)
+        job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    @staticmethod
+    def _run(job, fn, args, kwargs):
+        if job._cancel_event.is_set():
+            job.status = CANCELLED
+            return
+        job.status = RUNNING
+        start = time.perf_counter()
+        try:
+            job.result = fn(*args, progress=job.report_progress, **kwargs)
+            job.status = FINISHED
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            print(f"Batch job {job.job_id} failed: {e}")
+        observe("batch_job", time.perf_counter() - start, status=job.status)
+        inc("batch_jobs_total", help="Batch jobs run, by final status.", status=job.status)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
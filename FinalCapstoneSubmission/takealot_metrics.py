@@ -0,0 +1,270 @@
+"""
+Lightweight per-stage timing, counters and gauges.
+
+Off by default. Set TAKEALOT_METRICS=1 (or call `configure(enabled=True)`)
+to record:
+
+- stage latency histograms: `with stage("shap_values"): ...`
+- counters: `inc("predictions_total")`, `inc("prediction_cache_total", result="hit")`
+- gauges sampled when scraped: `register_gauge("session_bytes", "...", fn)`
+
+Metrics are served in the Prometheus text format by `serve(port)` (a
+local-only HTTP thread; with TAKEALOT_METRICS_PORT set, the app starts it
+when its first session opens) and by `render_prometheus()` for embedding
+elsewhere. With
+TAKEALOT_METRICS_LOG set, every stage timing is also appended to that file
+as one JSON object per line.
+
+When disabled, `stage()` returns a shared no-op context manager and `inc()`
+returns straight away, so instrumented code pays one flag check per call.
+"""
+import errno
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRIC_PREFIX = "takealot_"
+# Upper bounds (seconds) of the stage latency histogram buckets
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_METRIC = "stage_seconds"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}   # (stage, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}     # (name, labels) -> value
+_counter_help = {}
+_gauges = {}       # name -> (help, fn, label name for dict samples)
+_log = logging.getLogger("takealot.metrics")
+_log.propagate = False
+_server = None
+
+
+def _truthy(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def configure(enabled=None, log_path=None):
+    """Turn recording on or off (default: TAKEALOT_METRICS) and set the structured log file."""
+    global _enabled
+    _enabled = _truthy(os.environ.get("TAKEALOT_METRICS", "")) if enabled is None else bool(enabled)
+    log_path = log_path or os.environ.get("TAKEALOT_METRICS_LOG")
+    for handler in list(_log.handlers):
+        _log.removeHandler(handler)
+        handler.close()
+    if _enabled and log_path:
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _log.addHandler(handler)
+        _log.setLevel(logging.INFO)
+    return _enabled
+
+
+def enabled():
+    return _enabled
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def observe(name, seconds, **labels):
+    """Record one timing of stage `name`."""
+    if not _enabled:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(STAGE_BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(STAGE_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[len(STAGE_BUCKETS)] += 1
+        histogram[-1] += seconds
+    if _log.handlers:
+        _log.info(json.dumps({"ts": time.time(), "event": "stage", "stage": name,
+                              "seconds": round(seconds, 6), **labels}))
+
+
+class _Stage:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start,
+                **(dict(self.labels, error=exc_type.__name__) if exc_type else self.labels))
+        return False
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def stage(name, **labels):
+    """Context manager timing a block as stage `name` (failed blocks get an `error` label)."""
+    if not _enabled:
+        return _NOOP_STAGE
+    return _Stage(name, labels)
+
+
+def inc(name, value=1, help="", **labels):
+    """Add `value` to counter `name` (conventionally ending in _total)."""
+    if not _enabled:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        if help and name not in _counter_help:
+            _counter_help[name] = help
+
+
+def register_gauge(name, help, fn, label=None):
+    """Sample `fn()` at every scrape: a number, or {value of `label`: number} for a labelled gauge."""
+    with _lock:
+        _gauges[name] = (help, fn, label)
+
+
+def timed_iter(iterable, name, **labels):
+    """Yield from `iterable`, recording the time spent producing each item as stage `name`."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        observe(name, time.perf_counter() - start, **labels)
+        yield item
+
+
+def reset():
+    """Forget every recorded timing and counter (gauges stay registered)."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus():
+    """Every metric in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: list(values) for key, values in _histograms.items()}
+        counters = dict(_counters)
+        counter_help = dict(_counter_help)
+        gauges = dict(_gauges)
+
+    lines = []
+    metric = METRIC_PREFIX + STAGE_METRIC
+    lines += [f"# HELP {metric} Wall-clock time per processing stage.", f"# TYPE {metric} histogram"]
+    for (name, labels), values in sorted(histograms.items()):
+        base = (("stage", name),) + labels
+        cumulative = 0
+        for bound, count in zip(STAGE_BUCKETS, values):
+            cumulative += count
+            lines.append(f"{metric}_bucket{_format_labels(base, [('le', repr(bound))])} {cumulative}")
+        cumulative += values[len(STAGE_BUCKETS)]
+        lines.append(f"{metric}_bucket{_format_labels(base, [('le', '+Inf')])} {cumulative}")
+        lines.append(f"{metric}_sum{_format_labels(base)} {values[-1]}")
+        lines.append(f"{metric}_count{_format_labels(base)} {cumulative}")
+
+    for name in sorted({name for name, _ in counters}):
+        metric = METRIC_PREFIX + name
+        lines += [f"# HELP {metric} {counter_help.get(name, name)}", f"# TYPE {metric} counter"]
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    for name, (help, fn, label) in sorted(gauges.items()):
+        try:
+            value = fn()
+        except Exception:
+            continue  # a failing gauge must not break the scrape
+        metric = METRIC_PREFIX + name
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} gauge"]
+        if isinstance(value, dict):
+            for key, sample in sorted(value.items()):
+                lines.append(f"{metric}{_format_labels([(label, str(key))])} {sample}")
+        else:
+            lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """
+    Serve GET /metrics from a daemon thread (once per process); returns the server.
+
+    Returns None while another process holds the port (e.g. the one a
+    reload is replacing), so a later call can try again.
+    """
+    global _server
+    with _lock:
+        if _server is None:
+            try:
+                server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                if e.errno != errno.EADDRINUSE:
+                    raise
+                return None
+            _server = server
+            threading.Thread(target=_server.serve_forever, name="takealot-metrics", daemon=True).start()
+        return _server
+
+
+configure()
+register_gauge("process_resident_bytes", "Resident memory of this process in bytes.", process_rss_bytes)
@@ -0,0 +1,125 @@
+"""
+Lazy, thread-safe registry for the trained models and the SHAP explainer.
+
+Nothing is loaded at import time: each artifact is built on first use (or by
+`warm()` in a background thread) and then shared by every session.
+"""
+import threading
+import time
+
+import joblib
+
+from takealot_scoring import KMEANS_MODEL_PATH, XGB_MODEL_PATH
+
+
+class ModelRegistry:
+    """Loads the KMeans model, XGBoost model and SHAP TreeExplainer exactly once."""
+
+    def __init__(self, kmeans_path=KMEANS_MODEL_PATH, xgb_path=XGB_MODEL_PATH):
+        self.kmeans_path = kmeans_path
+        self.xgb_path = xgb_path
+        self._artifacts = {}
+        self._errors = {}
+        self._lock = threading.RLock()
+        self._warm_thread = None
+        # Seconds spent building each artifact, for startup benchmarking
+        self.load_seconds = {}
+
+    def _get(self, name, build):
+        artifact = self._artifacts.get(name)
+        if artifact is not None:
+            return artifact
+        with self._lock:
+            if name in self._artifacts:
+                return self._artifacts[name]
+            if name in self._errors:
+                raise self._errors[name]
+            start = time.perf_counter()
+            try:
+                artifact = build()
+            except Exception as e:
+                print(f"❌ Model loading error ({name}): {e}")
+                self._errors[name] = e
+                raise
+            self.load_seconds[name] = time.perf_counter() - start
+            self._artifacts[name] = artifact
+            return artifact
+
+    def kmeans(self):
+        def build():
+            model = joblib.load(self.kmeans_path)
+            print("✅ Loaded kmeans_model.pkl")
+            return model
+        return self._get("kmeans", build)
+
+    def xgb(self):
+        def build():
+            model = joblib.load(self.xgb_path)
+            print("✅ Loaded xgboost_model.joblib")
+            return model
+        return self._get("xgb", build)
+
+    def explainer(self):
+        def build():
+            # shap is slow to import, so it is only pulled in when first needed
+            import shap
+            explainer = shap.TreeExplainer(self.xgb())
+            print("✅ Built SHAP TreeExplainer")
+            return explainer
+        return self._get("explainer", build)
+
+    def flat_xgb(self):
+        """The XGBoost trees flattened into arrays (split thresholds), built once and not validated."""
+        def build():
+            from takealot_fastpath import FlatTreeEnsemble
+            return FlatTreeEnsemble(self.xgb())
+        return self._get("flat_xgb", build)
+
+    def fast_xgb(self):
+        """Validated array-backed single-row predictor, or None if it can't be built."""
+        def build():
+            from takealot_fastpath import validate_fast_path, validation_rows
+            ensemble = self.flat_xgb()
+            max_error = validate_fast_path(ensemble, self.xgb(), validation_rows(ensemble))
+            print(f"✅ Built fast single-row predictor (max error {max_error:.1e})")
+            return ensemble
+        try:
+            return self._get("fast_xgb", build)
+        except Exception:
+            return None
+
+    @property
+    def failed(self):
+        """True once a required artifact has failed to load."""
+        return any(name in self._errors for name in ("kmeans", "xgb", "explainer"))
+
+    @property
+    def ready(self):
+        return all(name in self._artifacts for name in ("kmeans", "xgb", "explainer"))
+
+    def load_all(self):
+        """Load every artifact in the calling thread; returns True on success."""
+        try:
+            self.kmeans()
+            self.xgb()
+            self.explainer()
+        except Exception:
+            return False
+        print("🎉 All models loaded successfully! (No scaling required)")
+        self.fast_xgb()
+        return True
+
+    def warm(self, *extra_warmers):
+        """Start loading everything in a daemon thread; returns immediately."""
+        with self._lock:
+            if self._warm_thread is None:
+                def run():
+                    self.load_all()
+                    for warmer in extra_warmers:
+                        try:
+                            warmer()
+                        except Exception as e:
+                            print(f"Warm-up error: {e}")
+                self._warm_thread = threading.Thread(target=run, name="takealot-warmup", daemon=True)
+                self._warm_thread.start()
+            return self._warm_thread
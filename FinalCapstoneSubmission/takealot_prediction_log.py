@@ -0,0 +1,93 @@
+"""
+Columnar, append-only log of single-customer predictions.
+
+Each column is a preallocated NumPy buffer that doubles when full, so an
+append writes one slot per column instead of creating a DataFrame. Once
+`max_rows` is reached the buffers act as a ring and the oldest rows are
+overwritten. A DataFrame is only built on export.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_ROWS = 10_000
+INITIAL_CAPACITY = 64
+
+# Column kinds: "float" and "int" are stored as-is, "category" as int16 codes
+# into a per-column list of labels, "datetime" as datetime64[us]
+KIND_DTYPES = {"float": np.float64, "int": np.int64, "category": np.int16,
+               "datetime": "datetime64[us]"}
+
+
+class PredictionLog:
+    """Fixed-schema append-only table with a retention cap."""
+
+    def __init__(self, columns, max_rows=DEFAULT_MAX_ROWS, initial_capacity=INITIAL_CAPACITY):
+        self.columns = list(columns)
+        self.max_rows = max_rows
+        capacity = min(initial_capacity, max_rows)
+        self._buffers = {name: np.empty(capacity, dtype=KIND_DTYPES[kind])
+                         for name, kind in self.columns}
+        self._categories = {name: {} for name, kind in self.columns if kind == "category"}
+        self._capacity = capacity
+        self._start = 0
+        self._size = 0
+        self.dropped_rows = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    @property
+    def column_names(self):
+        return [name for name, _ in self.columns]
+
+    def _grow(self):
+        # Only called before the first wrap, so rows occupy [0, size) in order
+        capacity = min(self._capacity * 2, self.max_rows)
+        for name, buffer in self._buffers.items():
+            grown = np.empty(capacity, dtype=buffer.dtype)
+            grown[:self._size] = buffer[:self._size]
+            self._buffers[name] = grown
+        self._capacity = capacity
+
+    def append(self, row):
+        """Append one row given as {column: value}; amortised O(1)."""
+        if self._size == self._capacity and self._capacity < self.max_rows:
+            self._grow()
+        if self._size < self._capacity:
+            slot = (self._start + self._size) % self._capacity
+            self._size += 1
+        else:
+            # Full: overwrite the oldest row
+            slot = self._start
+            self._start = (self._start + 1) % self._capacity
+            self.dropped_rows += 1
+        for name, kind in self.columns:
+            value = row[name]
+            if kind == "category":
+                codes = self._categories[name]
+                value = codes.setdefault(value, len(codes))
+            self._buffers[name][slot] = value
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    def _ordered(self, buffer):
+        end = self._start + self._size
+        if end <= self._capacity:
+            return buffer[self._start:end]
+        return np.concatenate([buffer[self._start:], buffer[:end - self._capacity]])
+
+    def to_frame(self):
+        """All retained rows, oldest first, as one DataFrame."""
+        data = {}
+        for name, kind in self.columns:
+            values = self._ordered(self._buffers[name])
+            if kind == "category":
+                values = pd.Categorical.from_codes(values, categories=list(self._categories[name]))
+            data[name] = values
+        return pd.DataFrame(data, columns=self.column_names)
@@ -0,0 +1,582 @@
+"""
+Batch scoring helpers for the Takealot Analytics Hub.
+
+Kept free of Shiny and plotting imports so the same scoring code can be
+reused by the dashboard and by offline jobs.
+"""
+import io
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+from takealot_checkpoint import (model_files_key, model_objects_key, partition_fingerprint,
+                                  scoring_config_key)
+from takealot_featurecache import FeatureSlice
+from takealot_metrics import inc, stage, timed_iter
+
+# Trained model artifacts, relative to the app directory
+KMEANS_MODEL_PATH = "models/kmeans_model.pkl"
+XGB_MODEL_PATH = "models/xgboost_model.joblib"
+
+# Features in the exact order expected by the XGBoost model (20 features)
+XGB_FEATURES = ["Administrative", "Administrative_Duration", "Informational",
+                "Informational_Duration", "ProductRelated", "ProductRelated_Duration",
+                "BounceRates", "ExitRates", "PageValues", "SpecialDay", "Month",
+                "OperatingSystems", "Browser", "Region", "TrafficType", "Weekend",
+                "VisitorType_Other", "VisitorType_Returning_Visitor", "Total_Duration",
+                "Interaction_Intensity"]
+
+# KMeans feature subset (9 features)
+KMEANS_FEATURES = ["Administrative_Duration", "ProductRelated_Duration",
+                   "Informational_Duration", "BounceRates", "ExitRates",
+                   "PageValues", "SpecialDay", "Weekend", "Interaction_Intensity"]
+
+# Rows read from the CSV per chunk - bounds peak memory regardless of file size
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Number of scored rows kept in memory for the results preview table
+PREVIEW_ROWS = 5
+
+# Result label categories; codes are 0/1 so labels are built without a per-row loop
+CLUSTER_LABELS = ["High-Intent", "Casual Browser"]
+INTENT_LABELS = ["Unlikely", "Likely"]
+# Columns score_chunk adds after the features
+SCORE_COLUMNS = ["Cluster", "ClusterLabel", "PurchaseProbability", "PurchaseIntent", "Timestamp"]
+
+# Purchase probability above which a session is labelled "Likely to Purchase"
+# (0.5 reproduces XGBClassifier.predict)
+DEFAULT_DECISION_THRESHOLD = 0.5
+
+# Batch explanations: strongest SHAP drivers kept per explained row, rows per
+# TreeExplainer call, and the default cap on explained rows per batch
+DEFAULT_TOP_K_DRIVERS = 3
+EXPLAIN_BATCH_SIZE = 2_000
+DEFAULT_EXPLAIN_ROWS = 500
+
+
+def count_csv_rows(path):
+    """
+    Count the data rows the CSV reader will see (header excluded).
+
+    Plain files are counted by their newlines without parsing. Files with
+    quoted fields (which may span lines) or blank lines (which the reader
+    skips) are counted by parsing their first column instead.
+    """
+    lines = 0
+    tail = b"\n"  # a blank first line counts as a blank line
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                break
+            joined = tail + block
+            if b'"' in block or b"\n\n" in joined or b"\n\r\n" in joined:
+                return _parse_csv_rows(path)
+            lines += block.count(b"\n")
+            tail = joined[-2:]
+    # Files without a trailing newline still have a final row
+    if tail[-1:] != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def _parse_csv_rows(path):
+    """Count data rows with the C parser, reading only the first column."""
+    chunks = pd.read_csv(path, usecols=[0], dtype=str, chunksize=DEFAULT_CHUNK_SIZE * 4)
+    return sum(len(chunk) for chunk in chunks)
+
+
+def missing_columns(columns):
+    """Return the (XGBoost, KMeans) feature columns absent from `columns`."""
+    columns = set(columns)
+    missing_xgb = [col for col in XGB_FEATURES if col not in columns]
+    missing_kmeans = [col for col in KMEANS_FEATURES if col not in columns]
+    return missing_xgb, missing_kmeans
+
+
+def predict_intent(xgb_model, features, threshold=DEFAULT_DECISION_THRESHOLD):
+    """
+    Run the booster once and return (purchase probabilities, 0/1 labels).
+
+    Labels are derived by thresholding the probability instead of a second
+    `predict` call, which would traverse every tree again.
+    """
+    purchase_probs = xgb_model.predict_proba(features)[:, 1]
+    purchase_preds = (purchase_probs > threshold).astype(np.int8)
+    return purchase_probs, purchase_preds
+
+
+def score_chunk(chunk, kmeans_model, xgb_model, timestamp=None,
+                threshold=DEFAULT_DECISION_THRESHOLD):
+    """
+    Score one DataFrame chunk with both models and return it with result columns.
+
+    The first column, `row`, is the chunk's index: partitions from
+    `iter_partitions` are indexed by their 0-based data row in the source
+    file, so sampled and resumed results can be joined back to it. The input
+    columns are referenced, not copied. Labels and the batch timestamp are
+    categoricals (1 byte per row) and probabilities float32.
+    """
+    # KMeans was fitted on float64 arrays; compact integer inputs are widened here
+    clusters = kmeans_model.predict(chunk[KMEANS_FEATURES].to_numpy(dtype=np.float64))
+    purchase_probs, purchase_preds = predict_intent(xgb_model, chunk[XGB_FEATURES], threshold)
+
+    n_rows = len(chunk)
+    columns = {"row": chunk.index.to_numpy(dtype=np.int64)}
+    columns.update(chunk.items())
+    columns["Cluster"] = clusters.astype(np.int8)
+    columns["ClusterLabel"] = pd.Categorical.from_codes((clusters != 0).astype(np.int8), CLUSTER_LABELS)
+    columns["PurchaseProbability"] = purchase_probs.astype(np.float32, copy=False)
+    columns["PurchaseIntent"] = pd.Categorical.from_codes(purchase_preds, INTENT_LABELS)
+    columns["Timestamp"] = pd.Categorical.from_codes(np.zeros(n_rows, dtype=np.int8),
+                                                     [timestamp or datetime.now().isoformat()])
+    return pd.DataFrame(columns, index=chunk.index, copy=False)
+
+
+def driver_columns(top_k=DEFAULT_TOP_K_DRIVERS):
+    """Result columns added by batch explanations, in output order."""
+    columns = []
+    for k in range(1, top_k + 1):
+        columns += [f"Driver{k}", f"Driver{k}_SHAP"]
+    return columns
+
+
+def result_dtypes(columns):
+    """
+    Read dtypes for the `columns` of a batch results CSV, so every chunk of it parses alike.
+
+    Without them pandas infers each chunk separately: a driver column that is
+    empty in one chunk comes back as float there and as text in the next.
+    """
+    driver_names = {col for col in columns if col.startswith("Driver") and not col.endswith("_SHAP")}
+    dtypes = {}
+    for col in columns:
+        if col in driver_names or col in ("ClusterLabel", "PurchaseIntent", "Timestamp"):
+            dtypes[col] = str
+        elif col == "row":
+            dtypes[col] = np.int64
+        elif col == "Cluster":
+            dtypes[col] = np.int8
+        elif col in XGB_FEATURES or col == "PurchaseProbability" or col.endswith("_SHAP"):
+            dtypes[col] = np.float64
+    return dtypes
+
+
+def result_columns(explain=False, top_k=DEFAULT_TOP_K_DRIVERS):
+    """Every column of a batch results file, in output order."""
+    columns = ["row"] + XGB_FEATURES + SCORE_COLUMNS
+    return columns + driver_columns(top_k) if explain else columns
+
+
+def explain_chunk(results, explainer, explain_mask, top_k=DEFAULT_TOP_K_DRIVERS):
+    """
+    Add top-k SHAP driver columns for the rows selected by `explain_mask`.
+
+    SHAP values are computed in vectorised sub-batches of EXPLAIN_BATCH_SIZE
+    rows. Unexplained rows get empty driver columns so every chunk writes the
+    same CSV header. Returns (results, per-feature sum of |SHAP|, rows explained).
+    """
+    for k in range(1, top_k + 1):
+        results[f"Driver{k}"] = None
+        results[f"Driver{k}_SHAP"] = np.float32(np.nan)
+
+    n_explained = int(explain_mask.sum())
+    if n_explained == 0:
+        return results, None, 0
+
+    features = results.loc[explain_mask, XGB_FEATURES]
+    shap_values = np.vstack([explainer.shap_values(features.iloc[i:i + EXPLAIN_BATCH_SIZE])
+                             for i in range(0, len(features), EXPLAIN_BATCH_SIZE)])
+
+    top = np.argsort(-np.abs(shap_values), axis=1)[:, :top_k]
+    names = np.asarray(XGB_FEATURES, dtype=object)
+    for k in range(top_k):
+        results.loc[explain_mask, f"Driver{k + 1}"] = names[top[:, k]]
+        results.loc[explain_mask, f"Driver{k + 1}_SHAP"] = (
+            np.take_along_axis(shap_values, top[:, k:k + 1], axis=1)[:, 0].astype(np.float32))
+
+    return results, np.abs(shap_values).sum(axis=0), n_explained
+
+
+def _plan_sample(total_rows, sample_size):
+    """Return sorted row positions to keep (None = all rows) and the rows to score."""
+    if 0 < sample_size < total_rows:
+        rng = np.random.default_rng(42)
+        keep_rows = np.sort(rng.choice(total_rows, size=sample_size, replace=False))
+        return keep_rows, sample_size
+    return None, total_rows
+
+
+def iter_partitions(input_path, chunk_size=DEFAULT_CHUNK_SIZE, keep_rows=None, engine=None,
+                    feature_cache=None, lazy=False):
+    """
+    Yield the CSV as DataFrame partitions of at most `chunk_size` rows, in input order.
+
+    Only the feature columns are parsed, into compact dtypes; missing or
+    non-numeric feature columns raise ValueError before any scoring.
+
+    With a `feature_cache`, a file whose content was seen before is read from
+    the memory-mapped cache instead of being parsed, and a new file is added
+    to it as it streams. `lazy=True` yields cached partitions as FeatureSlice
+    references (loaded by whoever scores them) rather than DataFrames. Callers
+    hold `feature_cache.reading(input_path)` until the partitions are scored,
+    so the entry cannot be evicted under them.
+    """
+    from takealot_ingest import iter_feature_chunks
+
+    if feature_cache is not None:
+        cached = feature_cache.lookup(input_path)
+        if cached is not None:
+            parts = cached.iter_slices(chunk_size, keep_rows)
+            if not lazy:
+                parts = (part.load() for part in parts)
+            yield from timed_iter(parts, "batch_read", source="feature_cache")
+            return
+
+    chunks = iter_feature_chunks(input_path, chunk_size=chunk_size, engine=engine)
+    if feature_cache is not None:
+        chunks = feature_cache.store(input_path, chunks)
+    chunks = timed_iter(chunks, "batch_read", source="csv")
+
+    rows_read = 0
+    for chunk in chunks:
+        chunk_start = rows_read
+        rows_read += len(chunk)
+
+        if keep_rows is not None:
+            lo, hi = np.searchsorted(keep_rows, [chunk_start, rows_read])
+            chunk = chunk.iloc[keep_rows[lo:hi] - chunk_start]
+            if chunk.empty:
+                continue
+
+        yield chunk
+
+
+def _reading(feature_cache, input_path):
+    """Lease on the file's feature cache entry for the length of a job (a no-op without a cache)."""
+    return nullcontext() if feature_cache is None else feature_cache.reading(input_path)
+
+
+def _plan_explain(target_rows, explain_rows):
+    """Sorted positions (among scored rows) to explain, or None when explanations are off."""
+    if explain_rows <= 0:
+        return None
+    if explain_rows >= target_rows:
+        return np.arange(target_rows)
+    rng = np.random.default_rng(7)
+    return np.sort(rng.choice(target_rows, size=explain_rows, replace=False))
+
+
+def _with_explain_masks(partitions, explain_positions):
+    """Pair each partition with a boolean mask of the rows it should explain."""
+    scored = 0
+    for chunk in partitions:
+        if explain_positions is None:
+            mask = None
+        else:
+            lo, hi = np.searchsorted(explain_positions, [scored, scored + len(chunk)])
+            mask = np.zeros(len(chunk), dtype=bool)
+            mask[explain_positions[lo:hi] - scored] = True
+        scored += len(chunk)
+        yield chunk, mask
+
+
+class ResultWriter:
+    """
+    Appends scored partitions to a CSV and keeps running summary totals.
+
+    With a CheckpointStore, every partition written with a fingerprint is
+    also saved there, and `write_saved` appends a saved partition's CSV
+    fragment and totals without scoring it again. If no partition is written
+    at all (an empty input), `finish` writes a header of `columns` so the
+    output always exists.
+    """
+
+    def __init__(self, output_path, target_rows, progress=None, checkpoints=None, columns=None):
+        self.output_path = output_path
+        self.target_rows = target_rows
+        self.progress = progress
+        self.checkpoints = checkpoints
+        self.columns = columns or result_columns()
+        self.summary = {
+            "output_path": output_path,
+            "total_rows": 0,
+            "high_intent_count": 0,
+            "likely_purchase_count": 0,
+            "purchase_prob_sum": 0.0,
+            "preview": None,
+            "explained_rows": 0,
+            "shap_abs_sum": None,
+            "reused_rows": 0,
+        }
+        self._header_written = False
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+    def write(self, results, shap_abs_sum=None, n_explained=0, fingerprint=None):
+        with stage("batch_format"):
+            fragment = results.to_csv(index=False, header=False).encode("utf-8")
+        totals = {
+            "header": results.iloc[:0].to_csv(index=False),
+            "rows": len(results),
+            "high_intent_count": int((results["Cluster"] == 0).sum()),
+            "likely_purchase_count": int((results["PurchaseIntent"] == "Likely").sum()),
+            "purchase_prob_sum": float(results["PurchaseProbability"].to_numpy().sum(dtype=np.float64)),
+            "explained_rows": n_explained,
+            "shap_abs_sum": None if shap_abs_sum is None else shap_abs_sum.tolist(),
+        }
+        if self.checkpoints is not None and fingerprint is not None:
+            self.checkpoints.save(fingerprint, fragment, totals)
+        if self.summary["preview"] is None:
+            self.summary["preview"] = results.head(PREVIEW_ROWS)
+        self._append(fragment, totals)
+
+    def write_saved(self, fragment, totals):
+        if self.summary["preview"] is None:
+            self.summary["preview"] = pd.read_csv(io.BytesIO(totals["header"].encode("utf-8") + fragment),
+                                                  nrows=PREVIEW_ROWS)
+        self.summary["reused_rows"] += totals["rows"]
+        self._append(fragment, totals, source="checkpoint")
+
+    def _append(self, fragment, totals, source="scored"):
+        summary = self.summary
+        with stage("batch_write"), open(self.output_path, "ab") as f:
+            if not self._header_written:
+                f.write(totals["header"].encode("utf-8"))
+                self._header_written = True
+            f.write(fragment)
+        inc("batch_rows_total", totals["rows"], help="Rows written by batch scoring.", source=source)
+
+        summary["total_rows"] += totals["rows"]
+        summary["high_intent_count"] += totals["high_intent_count"]
+        summary["likely_purchase_count"] += totals["likely_purchase_count"]
+        summary["purchase_prob_sum"] += totals["purchase_prob_sum"]
+        if totals["explained_rows"]:
+            shap_abs_sum = np.asarray(totals["shap_abs_sum"], dtype=np.float64)
+            summary["explained_rows"] += totals["explained_rows"]
+            summary["shap_abs_sum"] = (shap_abs_sum if summary["shap_abs_sum"] is None
+                                       else summary["shap_abs_sum"] + shap_abs_sum)
+
+        if self.progress is not None:
+            self.progress(summary["total_rows"], self.target_rows)
+
+    def finish(self):
+        summary = self.summary
+        if not self._header_written:
+            with open(self.output_path, "wb") as f:
+                f.write(pd.DataFrame(columns=self.columns).to_csv(index=False).encode("utf-8"))
+            self._header_written = True
+        summary["avg_purchase_prob"] = (summary["purchase_prob_sum"] / summary["total_rows"]
+                                        if summary["total_rows"] else 0.0)
+        # Aggregate global importance over the explained rows
+        summary["mean_abs_shap"] = None
+        if summary["explained_rows"]:
+            summary["mean_abs_shap"] = pd.Series(summary["shap_abs_sum"] / summary["explained_rows"],
+                                                 index=XGB_FEATURES).sort_values(ascending=False)
+        if self.checkpoints is not None:
+            self.checkpoints.evict()
+        return summary
+
+
+def _load_checkpoint(checkpoints, config_key, chunk, explain_mask):
+    """(fingerprint, saved partition or None) for a partition; (None, None) without checkpoints."""
+    if checkpoints is None:
+        return None, None
+    data = chunk.load() if isinstance(chunk, FeatureSlice) else chunk
+    fingerprint = partition_fingerprint(config_key, data, explain_mask)
+    return fingerprint, checkpoints.load(fingerprint)
+
+
+def stream_score_csv(input_path, output_path, kmeans_model, xgb_model,
+                     chunk_size=DEFAULT_CHUNK_SIZE, sample_size=0, progress=None,
+                     threshold=DEFAULT_DECISION_THRESHOLD, explainer=None,
+                     explain_rows=0, top_k=DEFAULT_TOP_K_DRIVERS, feature_cache=None,
+                     checkpoints=None, model_key=None):
+    """
+    Score a CSV in fixed-size chunks, appending results to `output_path`.
+
+    Only one chunk is held in memory at a time. `sample_size` > 0 scores a
+    reproducible random subset of rows, drawn with a fixed seed (42); the row
+    set differs from the one the pre-streaming sampler picked.
+    `threshold` is the purchase probability cut-off for the "Likely" label.
+    `progress(rows_done, total_rows)` is called after every chunk.
+
+    With an `explainer` and `explain_rows` > 0, up to `explain_rows` randomly
+    chosen rows also get their `top_k` SHAP drivers (see `explain_chunk`).
+    `feature_cache` (a FeatureCache) skips CSV parsing for previously seen files.
+
+    With `checkpoints` (a CheckpointStore), each finished partition is saved
+    and partitions saved by an earlier run with the same rows and settings
+    are reused instead of re-scored, so a failed or cancelled run resumes
+    where it stopped. `model_key` identifies the models for that purpose
+    (default: a digest of the pickled model objects).
+
+    Returns a summary dict with running totals and a small preview frame.
+    """
+    keep_rows, target_rows = _plan_sample(count_csv_rows(input_path), sample_size)
+    explain_positions = _plan_explain(target_rows, explain_rows) if explainer is not None else None
+    writer = ResultWriter(output_path, target_rows, progress, checkpoints,
+                          result_columns(explain_positions is not None, top_k))
+    timestamp = datetime.now().isoformat()
+    config_key = None
+    if checkpoints is not None:
+        config_key = scoring_config_key(model_key or model_objects_key(kmeans_model, xgb_model),
+                                        threshold, top_k)
+
+    with _reading(feature_cache, input_path):
+        partitions = iter_partitions(input_path, chunk_size, keep_rows, feature_cache=feature_cache)
+        for chunk, explain_mask in _with_explain_masks(partitions, explain_positions):
+            fingerprint, saved = _load_checkpoint(checkpoints, config_key, chunk, explain_mask)
+            if saved is not None:
+                writer.write_saved(*saved)
+                continue
+            with stage("batch_score"):
+                results = score_chunk(chunk, kmeans_model, xgb_model, timestamp, threshold)
+            if explain_mask is None:
+                writer.write(results, fingerprint=fingerprint)
+            else:
+                with stage("batch_explain"):
+                    explained = explain_chunk(results, explainer, explain_mask, top_k)
+                writer.write(*explained, fingerprint=fingerprint)
+
+    return writer.finish()
+
+
+# ---- Multi-core scoring -------------------------------------------------
+# Each pool process loads its own copy of the models once (in the
+# initializer) and then scores whole partitions sent to it.
+
+_worker_models = None
+_worker_explainer = None
+_scoring_pool = None
+_scoring_pool_key = None
+_scoring_pool_lock = threading.Lock()
+
+
+def _init_scoring_worker(kmeans_path, xgb_path):
+    global _worker_models
+    # One thread per process - parallelism comes from the pool itself
+    threadpool_limits(1)
+    kmeans_model = joblib.load(kmeans_path)
+    xgb_model = joblib.load(xgb_path)
+    xgb_model.get_booster().set_param({"nthread": 1})
+    _worker_models = (kmeans_model, xgb_model)
+
+
+def _score_partition(chunk, timestamp, threshold, explain_mask=None, top_k=DEFAULT_TOP_K_DRIVERS):
+    global _worker_explainer
+    kmeans_model, xgb_model = _worker_models
+    if isinstance(chunk, FeatureSlice):
+        # Cached partitions arrive as references; the worker maps the columns itself
+        chunk = chunk.load()
+    results = score_chunk(chunk, kmeans_model, xgb_model, timestamp, threshold)
+    if explain_mask is None:
+        return results, None, 0
+    if _worker_explainer is None:
+        # Only workers that are asked to explain pay for importing shap
+        import shap
+        _worker_explainer = shap.TreeExplainer(xgb_model)
+    return explain_chunk(results, _worker_explainer, explain_mask, top_k)
+
+
+def get_scoring_pool(workers, kmeans_path=KMEANS_MODEL_PATH, xgb_path=XGB_MODEL_PATH):
+    """Return the shared process pool, (re)creating it if the configuration changed."""
+    global _scoring_pool, _scoring_pool_key
+    key = (workers, os.path.abspath(kmeans_path), os.path.abspath(xgb_path))
+    with _scoring_pool_lock:
+        if _scoring_pool is None or _scoring_pool_key != key:
+            if _scoring_pool is not None:
+                _scoring_pool.shutdown(wait=False, cancel_futures=True)
+            # spawn, not fork: the dashboard process runs threads and an event loop
+            _scoring_pool = ProcessPoolExecutor(max_workers=workers,
+                                                mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=_init_scoring_worker,
+                                                initargs=key[1:])
+            _scoring_pool_key = key
+        return _scoring_pool
+
+
+def shutdown_scoring_pool():
+    global _scoring_pool, _scoring_pool_key
+    with _scoring_pool_lock:
+        if _scoring_pool is not None:
+            _scoring_pool.shutdown(wait=False, cancel_futures=True)
+        _scoring_pool = None
+        _scoring_pool_key = None
+
+
+def parallel_score_csv(input_path, output_path, workers=None,
+                       kmeans_path=KMEANS_MODEL_PATH, xgb_path=XGB_MODEL_PATH,
+                       chunk_size=DEFAULT_CHUNK_SIZE, sample_size=0, progress=None,
+                       threshold=DEFAULT_DECISION_THRESHOLD, explain_rows=0,
+                       top_k=DEFAULT_TOP_K_DRIVERS, feature_cache=None, checkpoints=None,
+                       model_key=None):
+    """
+    Score a CSV across a pool of worker processes, one partition per task.
+
+    Partitions are dispatched as they are read and results are written back
+    strictly in input order. At most two partitions per worker are in flight,
+    so memory stays bounded like `stream_score_csv`. Takes the same options
+    and returns the same summary dict; explanations use a TreeExplainer built
+    inside each worker. Partitions of a cached dataset are sent as FeatureSlice
+    references, so workers read the shared memory-mapped pages instead of
+    receiving pickled frames. Checkpointed partitions are reused in place and
+    never reach the pool; `model_key` defaults to a digest of the model files.
+    """
+    workers = workers or os.cpu_count() or 1
+    keep_rows, target_rows = _plan_sample(count_csv_rows(input_path), sample_size)
+    explain_positions = _plan_explain(target_rows, explain_rows)
+    writer = ResultWriter(output_path, target_rows, progress, checkpoints,
+                          result_columns(explain_positions is not None, top_k))
+    timestamp = datetime.now().isoformat()
+    config_key = None
+    if checkpoints is not None:
+        config_key = scoring_config_key(model_key or model_files_key(kmeans_path, xgb_path),
+                                        threshold, top_k)
+
+    pool = get_scoring_pool(workers, kmeans_path, xgb_path)
+    # (future, fingerprint) for submitted partitions, (None, saved) for reused ones
+    pending = deque()
+
+    def write_next():
+        future, payload = pending.popleft()
+        if future is None:
+            writer.write_saved(*payload)
+        else:
+            # Workers are separate processes; the parent times how long it waits on them
+            with stage("batch_wait_worker"):
+                scored = future.result()
+            writer.write(*scored, fingerprint=payload)
+
+    try:
+        with _reading(feature_cache, input_path):
+            partitions = iter_partitions(input_path, chunk_size, keep_rows,
+                                         feature_cache=feature_cache, lazy=True)
+            for chunk, explain_mask in _with_explain_masks(partitions, explain_positions):
+                fingerprint, saved = _load_checkpoint(checkpoints, config_key, chunk, explain_mask)
+                if saved is not None:
+                    pending.append((None, saved))
+                else:
+                    pending.append((pool.submit(_score_partition, chunk, timestamp, threshold,
+                                                explain_mask, top_k), fingerprint))
+                if len(pending) >= 2 * workers:
+                    write_next()
+            # Still leased: queued FeatureSlices are only mapped once a worker picks them up
+            while pending:
+                write_next()
+    finally:
+        # Cancelled or failed runs must not leave work queued on the shared pool
+        for future, _ in pending:
+            if future is not None:
+                future.cancel()
+
+    return writer.finish()
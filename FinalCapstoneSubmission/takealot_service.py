@@ -0,0 +1,314 @@
+"""
+JSON scoring service with request micro-batching.
+
+    python takealot_service.py --port 8100 --max-batch-size 64 --max-wait-ms 5
+
+POST /score takes one session's features - the cleaned dataset columns, or
+a raw online_shoppers_intention row - or {"sessions": [...]}. Concurrent
+sessions are queued and scored together: once a session is queued the
+batcher waits at most `max_wait_ms` for more (or until `max_batch_size` are
+queued), then scores the micro-batch with one KMeans and one XGBoost call
+through `score_chunk`, the same function batch scoring uses. Sessions that
+arrive while a batch is being scored form the next one, so batches grow with
+load instead of requests queueing behind single-row model calls.
+
+GET /stats reports throughput, batch sizes and latency percentiles, GET
+/health readiness and GET /metrics the same numbers in the Prometheus text
+format (stage timings and counters are recorded when TAKEALOT_METRICS=1). Runs on Starlette and uvicorn (installed with Shiny);
+Shiny and the plotting libraries are never imported.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from takealot_cli import DEFAULT_KMEANS_PATH, DEFAULT_XGB_PATH
+from takealot_ingest import FEATURE_COLUMNS, RAW_COLUMNS, engineer_features
+from takealot_metrics import PROMETHEUS_CONTENT_TYPE, inc, observe, register_gauge, render_prometheus
+from takealot_models import ModelRegistry
+from takealot_scoring import DEFAULT_DECISION_THRESHOLD, score_chunk
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+# Larger payloads should go through takealot_cli instead
+MAX_SESSIONS_PER_REQUEST = 1000
+
+# Latency percentiles cover the most recent sessions; throughput the last minute
+LATENCY_WINDOW = 10_000
+THROUGHPUT_WINDOW_SECONDS = 60.0
+
+# Raw rows 1 and 66 of online_shoppers_intention.csv with the purchase
+# probability range each must score in. They are checked at startup: a
+# one-page bounce (Revenue FALSE) scores about 0.81 if raw sessions ever reach
+# the models unscaled, instead of about 0.0002.
+REFERENCE_SESSIONS = [
+    ({"Administrative": 0, "Administrative_Duration": 0.0, "Informational": 0,
+      "Informational_Duration": 0.0, "ProductRelated": 1, "ProductRelated_Duration": 0.0,
+      "BounceRates": 0.2, "ExitRates": 0.2, "PageValues": 0.0, "SpecialDay": 0.0, "Month": "Feb",
+      "OperatingSystems": 1, "Browser": 1, "Region": 1, "TrafficType": 1,
+      "VisitorType": "Returning_Visitor", "Weekend": "FALSE"}, (0.0, 0.05)),
+    ({"Administrative": 3, "Administrative_Duration": 87.83333333, "Informational": 0,
+      "Informational_Duration": 0.0, "ProductRelated": 27, "ProductRelated_Duration": 798.3333333,
+      "BounceRates": 0.0, "ExitRates": 0.012643678, "PageValues": 22.9160357, "SpecialDay": 0.8,
+      "Month": "Feb", "OperatingSystems": 2, "Browser": 2, "Region": 3, "TrafficType": 1,
+      "VisitorType": "Returning_Visitor", "Weekend": "FALSE"}, (0.5, 1.0)),
+]
+
+
+def parse_session(session):
+    """
+    Validate one session and return its model feature vector (float64, XGBoost order).
+
+    Raises ValueError naming the missing or non-numeric fields.
+    """
+    if not isinstance(session, dict):
+        raise ValueError("Each session must be a JSON object of feature values")
+    if all(col in session for col in FEATURE_COLUMNS):
+        try:
+            vector = np.array([session[col] for col in FEATURE_COLUMNS], dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError("Feature values must be numbers") from None
+    elif all(col in session for col in RAW_COLUMNS):
+        # Raw export rows get the same encoding as uploaded raw files
+        raw = pd.DataFrame([{col: session[col] for col in RAW_COLUMNS}])
+        try:
+            vector = engineer_features(raw).to_numpy(dtype=np.float64)[0]
+        except (TypeError, ValueError) as e:
+            raise ValueError(str(e)) from None
+    else:
+        missing = [col for col in FEATURE_COLUMNS if col not in session]
+        raise ValueError(f"Missing features: {missing}")
+    if not np.isfinite(vector).all():
+        raise ValueError("Feature values must be finite")
+    return vector
+
+
+class ServiceStats:
+    """Counters and a rolling window of per-session latencies."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.monotonic()
+        self.sessions = 0
+        self.batches = 0
+        self.errors = 0
+        self.largest_batch = 0
+        self._latencies = deque(maxlen=window)  # (finished at, seconds)
+
+    def record_batch(self, latencies, finished_at):
+        self.batches += 1
+        self.sessions += len(latencies)
+        self.largest_batch = max(self.largest_batch, len(latencies))
+        self._latencies.extend((finished_at, latency) for latency in latencies)
+
+    def snapshot(self):
+        now = time.monotonic()
+        uptime = now - self.started
+        window = min(THROUGHPUT_WINDOW_SECONDS, uptime) or 1.0
+        recent = sum(1 for finished_at, _ in self._latencies if now - finished_at <= window)
+        latencies_ms = np.array([latency for _, latency in self._latencies]) * 1000
+        percentiles = {}
+        if len(latencies_ms):
+            percentiles = {f"p{q}": float(np.percentile(latencies_ms, q)) for q in (50, 95, 99)}
+            percentiles["max"] = float(latencies_ms.max())
+        return {
+            "uptime_seconds": uptime,
+            "sessions_scored": self.sessions,
+            "batches": self.batches,
+            "errors": self.errors,
+            "mean_batch_size": self.sessions / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "throughput_per_second": recent / window,
+            "latency_ms": percentiles,
+        }
+
+
+class MicroBatcher:
+    """Groups concurrently submitted sessions and scores each group with one call."""
+
+    def __init__(self, score_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, stats=None):
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = stats or ServiceStats()
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Scoring service is shutting down"))
+
+    async def submit(self, vector):
+        """Queue one feature vector and wait for its result dict."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((vector, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            vectors = np.vstack([vector for vector, _, _ in batch])
+            started = time.perf_counter()
+            try:
+                # Off the event loop, so requests keep queueing for the next batch meanwhile
+                results = await asyncio.to_thread(self.score_batch, vectors)
+            except Exception as e:
+                self.stats.errors += len(batch)
+                inc("service_sessions_total", len(batch), help="Sessions scored by the service.",
+                    status="error")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finished_at = time.perf_counter()
+            observe("service_batch", finished_at - started)
+            inc("service_sessions_total", len(batch), help="Sessions scored by the service.", status="ok")
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():  # the client may have gone away
+                    future.set_result(result)
+            self.stats.record_batch([finished_at - queued_at for _, _, queued_at in batch],
+                                    time.monotonic())
+
+
+def make_batch_scorer(models, threshold=DEFAULT_DECISION_THRESHOLD):
+    """score_batch(vectors) -> list of result dicts, using the registry's models."""
+    def score_batch(vectors):
+        frame = pd.DataFrame(vectors, columns=FEATURE_COLUMNS)
+        results = score_chunk(frame, models.kmeans(), models.xgb(), threshold=threshold)
+        return [{"cluster": int(cluster), "segment": segment,
+                 "purchase_probability": round(float(probability), 6), "purchase_intent": intent}
+                for cluster, segment, probability, intent in zip(
+                    results["Cluster"].to_numpy(), results["ClusterLabel"].astype(str),
+                    results["PurchaseProbability"].to_numpy(), results["PurchaseIntent"].astype(str))]
+    return score_batch
+
+
+def check_reference_sessions(score_batch):
+    """Score REFERENCE_SESSIONS; raise RuntimeError if any falls outside its expected range."""
+    results = score_batch([parse_session(session) for session, _ in REFERENCE_SESSIONS])
+    for i, ((_, (lo, hi)), result) in enumerate(zip(REFERENCE_SESSIONS, results)):
+        probability = result["purchase_probability"]
+        if not lo <= probability <= hi:
+            raise RuntimeError(f"Reference session {i} scored {probability:.4f}, expected "
+                               f"{lo}-{hi}; check the models and models/feature_scaler.json")
+
+
+def create_app(models=None, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+               threshold=DEFAULT_DECISION_THRESHOLD):
+    """
+    The ASGI app; models are loaded during startup so the first request is not a cold start.
+
+    Startup fails if the reference sessions score outside their expected ranges.
+    """
+    models = models or ModelRegistry(DEFAULT_KMEANS_PATH, DEFAULT_XGB_PATH)
+    batcher = MicroBatcher(make_batch_scorer(models, threshold), max_batch_size, max_wait_ms)
+    register_gauge("service_mean_batch_size", "Mean sessions per scored micro-batch.",
+                   lambda: batcher.stats.snapshot()["mean_batch_size"])
+    register_gauge("service_latency_ms", "Recent per-session latency percentiles in milliseconds.",
+                   lambda: batcher.stats.snapshot()["latency_ms"], label="percentile")
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await asyncio.to_thread(models.kmeans)
+        await asyncio.to_thread(models.xgb)
+        await asyncio.to_thread(check_reference_sessions, batcher.score_batch)
+        batcher.start()
+        yield
+        await batcher.stop()
+
+    async def score(request):
+        try:
+            payload = json.loads(await request.body())
+        except ValueError:
+            return JSONResponse({"error": "Request body must be JSON"}, status_code=400)
+        single = not (isinstance(payload, dict) and "sessions" in payload)
+        sessions = [payload] if single else payload["sessions"]
+        if not isinstance(sessions, list) or not sessions:
+            return JSONResponse({"error": "'sessions' must be a non-empty list"}, status_code=422)
+        if len(sessions) > MAX_SESSIONS_PER_REQUEST:
+            return JSONResponse({"error": f"At most {MAX_SESSIONS_PER_REQUEST} sessions per request"},
+                                status_code=413)
+        try:
+            vectors = [parse_session(session) for session in sessions]
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=422)
+        results = await asyncio.gather(*(batcher.submit(vector) for vector in vectors))
+        return JSONResponse(results[0] if single else {"results": results})
+
+    async def stats(request):
+        return JSONResponse(batcher.stats.snapshot())
+
+    async def metrics(request):
+        return Response(render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+    async def health(request):
+        return JSONResponse({"status": "ok", "max_batch_size": batcher.max_batch_size,
+                             "max_wait_ms": batcher.max_wait * 1000})
+
+    app = Starlette(routes=[Route("/score", score, methods=["POST"]),
+                            Route("/stats", stats),
+                            Route("/health", health),
+                            Route("/metrics", metrics)],
+                    lifespan=lifespan)
+    app.state.batcher = batcher
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Takealot purchase-intent scoring service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="most sessions scored per model call (default: %(default)s)")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="longest a queued session waits for its batch to fill (default: %(default)s)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_DECISION_THRESHOLD,
+                        help="purchase probability cut-off for 'Likely' (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    uvicorn.run(create_app(max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+                           threshold=args.threshold),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
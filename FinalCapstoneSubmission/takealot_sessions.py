@@ -0,0 +1,125 @@
+"""
+Session-scoped state for the Shiny app.
+
+Dataset previews, batch summaries and prediction logs belong to the session
+that created them instead of module globals, so concurrent users never see
+or overwrite each other's data. Every value is sized when stored, sessions
+are capped at `max_session_bytes`, and all of a session's state is dropped
+when it disconnects.
+"""
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_SESSION_BYTES = 256 * 1024 ** 2
+
+
+class SessionLimitExceeded(ValueError):
+    """Raised when storing a value would push a session over its memory budget."""
+
+
+def estimate_nbytes(value):
+    """Approximate in-memory size of a value, counting DataFrame contents deeply."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, (int, np.integer)):
+        return int(nbytes)
+    return sys.getsizeof(value)
+
+
+class SessionState:
+    """Named values owned by one session, with a running size total."""
+
+    def __init__(self, session_id, max_bytes=DEFAULT_MAX_SESSION_BYTES):
+        self.session_id = session_id
+        self.max_bytes = max_bytes
+        self._values = {}
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def put(self, key, value):
+        """Store `value` under `key`, replacing any previous value; enforces the budget."""
+        size = estimate_nbytes(value)
+        with self._lock:
+            others = sum(s for k, s in self._sizes.items() if k != key)
+            if self.max_bytes and others + size > self.max_bytes:
+                raise SessionLimitExceeded(
+                    f"{key} needs {size / 1024 ** 2:.1f} MB but the session limit is "
+                    f"{self.max_bytes / 1024 ** 2:.0f} MB ({others / 1024 ** 2:.1f} MB in use)")
+            self._values[key] = value
+            self._sizes[key] = size
+        return value
+
+    def resize(self, key):
+        """Re-measure a value that grows in place (e.g. an append-only log)."""
+        with self._lock:
+            if key in self._values:
+                self._sizes[key] = estimate_nbytes(self._values[key])
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self._sizes.pop(key, None)
+            return self._values.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._sizes.clear()
+
+    @property
+    def nbytes(self):
+        return sum(self._sizes.values())
+
+    def usage(self):
+        return dict(self._sizes)
+
+
+class SessionStore:
+    """Registry of live sessions' state."""
+
+    def __init__(self, max_session_bytes=DEFAULT_MAX_SESSION_BYTES):
+        self.max_session_bytes = max_session_bytes
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.released_sessions = 0
+
+    def open(self, session_id):
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = SessionState(session_id, self.max_session_bytes)
+                self._sessions[session_id] = state
+            return state
+
+    def release(self, session_id):
+        """Forget a session and everything it stored."""
+        with self._lock:
+            state = self._sessions.pop(session_id, None)
+            if state is not None:
+                self.released_sessions += 1
+        if state is not None:
+            state.clear()
+
+    def stats(self):
+        with self._lock:
+            sessions = dict(self._sessions)
+        per_session = {session_id: state.nbytes for session_id, state in sessions.items()}
+        return {
+            "sessions": len(per_session),
+            "bytes_total": sum(per_session.values()),
+            "bytes_per_session": per_session,
+            "released_sessions": self.released_sessions,
+        }
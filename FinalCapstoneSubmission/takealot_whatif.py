@@ -0,0 +1,90 @@
+"""
+What-if sensitivity sweeps for a single customer.
+
+One customer's feature row is copied across a grid of values for one or two
+features (everything else held fixed) and the whole grid is scored with a
+single `predict_proba` call, so a 101-point curve or a 41 x 41 heatmap costs
+about as much as one prediction round trip. Durations keep their derived
+page counts and total duration in step, the same way the dashboard inputs do.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+# Seconds per page used to estimate page counts from durations
+PAGE_SECONDS = {"Administrative": 30, "ProductRelated": 45, "Informational": 60}
+
+# Sweepable features: display label and the range of the matching dashboard input
+SWEEP_FEATURES = {
+    "PageValues": ("Page Value (Rand)", 0.0, 500.0),
+    "ExitRates": ("Exit Rate", 0.0, 1.0),
+    "BounceRates": ("Bounce Rate", 0.0, 1.0),
+    "ProductRelated_Duration": ("Product Browsing Duration (s)", 0.0, 7200.0),
+    "Administrative_Duration": ("Administrative Duration (s)", 0.0, 3600.0),
+    "Informational_Duration": ("Informational Duration (s)", 0.0, 3600.0),
+    "Interaction_Intensity": ("Interaction Intensity", 0.0, 1.0),
+    "SpecialDay": ("Special Day Proximity", 0.0, 1.0),
+}
+
+# Grid points per axis: one feature gives a curve, two a heatmap
+CURVE_POINTS = 101
+HEATMAP_POINTS = 41
+
+
+def derive_page_features(frame):
+    """Recompute page counts and Total_Duration from the duration columns, in place."""
+    for pages, seconds in PAGE_SECONDS.items():
+        frame[pages] = np.maximum(1, frame[f"{pages}_Duration"] // seconds)
+    frame["Total_Duration"] = (frame["Administrative_Duration"] + frame["ProductRelated_Duration"]
+                               + frame["Informational_Duration"])
+    return frame
+
+
+def build_grid(base, features, points=None):
+    """
+    Copies of the one-row frame `base` with `features` set to every grid combination.
+
+    Returns (grid frame, list of axis value arrays). The first feature varies
+    slowest, so probabilities reshape to (len(axes[0]), len(axes[1])).
+    """
+    if not 1 <= len(features) <= 2 or len(set(features)) != len(features):
+        raise ValueError("Choose one feature, or two different features")
+    unknown = [name for name in features if name not in SWEEP_FEATURES]
+    if unknown:
+        raise ValueError(f"Cannot sweep {unknown}; choose from {list(SWEEP_FEATURES)}")
+    points = points or (CURVE_POINTS if len(features) == 1 else HEATMAP_POINTS)
+
+    axes = [np.linspace(SWEEP_FEATURES[name][1], SWEEP_FEATURES[name][2], points) for name in features]
+    mesh = np.meshgrid(*axes, indexing="ij")
+    n_rows = mesh[0].size
+    grid = pd.DataFrame(np.repeat(base.to_numpy(dtype=np.float64), n_rows, axis=0), columns=base.columns)
+    for name, values in zip(features, mesh):
+        grid[name] = values.ravel()
+    if any(name.endswith("_Duration") for name in features):
+        derive_page_features(grid)
+    return grid, axes
+
+
+def sensitivity_sweep(xgb_model, base, features, points=None):
+    """
+    Purchase probability over a grid around `base` (one row, XGBoost feature order).
+
+    The unmodified row is scored in the same call, for the "current" marker.
+    Returns a dict with features, axes, probability (1-D for one feature,
+    2-D for two), base_values, base_probability, rows_scored and score_seconds.
+    """
+    grid, axes = build_grid(base, features, points)
+    frame = pd.concat([grid, base.astype(np.float64)], ignore_index=True)
+    start = time.perf_counter()
+    probabilities = xgb_model.predict_proba(frame)[:, 1]
+    score_seconds = time.perf_counter() - start
+    return {
+        "features": list(features),
+        "axes": axes,
+        "probability": probabilities[:-1].reshape([len(axis) for axis in axes]),
+        "base_values": [float(base[name].iloc[0]) for name in features],
+        "base_probability": float(probabilities[-1]),
+        "rows_scored": len(frame),
+        "score_seconds": score_seconds,
+    }